@@ -48,25 +48,24 @@ Author:
 
 import re
 import json
-from io import BytesIO
-import time
 import hashlib
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import streamlit as st
 
-from utils import extract_tag
+from utils import extract_tags
 
 # Knowledge Base (Vector Store)
 from kb import (
     ensure_client,
     create_vector_store,
-    upload_file_to_vs,
+    upload_files_to_vs,
     vector_store_supported,
 )
 
 from openai import __version__ as openai_version  # diagnostics
-from openai import RateLimitError, APIError
 
 # Google Doc helpers
 from gdoc_utils import (
@@ -79,20 +78,23 @@ from module_tags import split_text_by_module_tags
 
 # Canvas-page parsers
 from parsers import (
+    docx_bytes_to_text,
     extract_canvas_pages_from_text,
-    extract_canvas_pages,
+    read_docx_bytes,
     scan_canvas_page_tags,
 )
 
 # Canvas API interactions
 from canvas_api import (
     list_modules,
+    prefetch_module_cache,
     list_module_items,
     get_page_body,
     get_discussion_body,
     get_quiz_description,
     get_assignment_description,
     get_or_create_module,
+    invalidate_module,
     add_page,
     add_assignment,
     add_discussion,
@@ -100,8 +102,31 @@ from canvas_api import (
 )
 
 # Quiz creation handlers
-from quizzes_classic import add_quiz, add_quiz_question
-from quizzes_new import add_new_quiz, add_item_for_question
+from quizzes_classic import add_quiz, add_quiz_questions
+from quizzes_new import add_new_quiz, add_items_for_questions
+
+# Rate-limited parallel GPT calls
+from gpt_parallel import OpenAIRateLimiter, complete_many, stream_with_retry
+
+# OpenAI Batch API (large storyboards)
+from gpt_batch import (
+    build_batch_jsonl,
+    submit_batch,
+    retrieve_batch,
+    read_batch_output,
+    batch_errors,
+    TERMINAL_STATUSES,
+)
+
+
+# Model output clean-up (compiled once; applied to every GPT response)
+_FENCE_RE = re.compile(r"```(html|json)?", re.IGNORECASE)
+
+# Shared read-only stand-in for items without GPT output (never mutated)
+_EMPTY_RESULT = {"html": "", "quiz_json": None}
+
+# Per-block metadata tags, read in one sweep by the Parse step
+_PAGE_META_TAGS = ("page_type", "page_title", "module_name", "page_template")
 
 
 def _init_state():
@@ -110,10 +135,13 @@ def _init_state():
         "pages": [],
         "gpt_results": {},
         "visualized": False,
+        "gpt_batch": None,  # {"id", "indices"} of the last submitted batch
         # KB
         "vector_store_id": None,
         # Canvas caches
         "course_modules": [],
+        "module_cache_by_course": {},  # "domain|course_id" → {module key: id}
+        "uploaded_ids": {},  # "domain|course_id" → {content hash: created item}
         "module_pages_cache": {},
         "module_discussions_cache": {},
         "module_quizzes_cache": {},
@@ -134,28 +162,582 @@ def _init_state():
             st.session_state[k] = v
 
 
-def call_openai_with_retry(client, **kwargs) -> str:
+# DO NOT CHANGE THIS BLOCK (base_rules) – kept exactly as provided
+_BASE_RULES = (
+    "You are an expert Canvas HTML generator.\n"
+    "- Preserve ALL <a href> links and any <img> or <table> in the storyboard.\n"
+    "- Replace only inner content of template areas; keep structure/classes/attributes intact.\n"
+    "  if a section has no content, remove the template section in place; append extra sections at the end.\n"
+    "- if a section does not exist in the template, create it with the same structure.\n"
+    "- <element_type> tags are used to mark template code associations found within the file_search.\n"
+    "- If some content does not map, append it as it appears in the storyboard."
+    "- if a section does not exist in the template, create it with the same structure.\n"
+    "- <element_type> tags are used to mark template code associations found within the file_search.\n"
+    "- <accordion_title> are used for the summary tag in html accordions.\n"
+    "- <accordion_content> are used for the content inside the accordion.\n"
+    "- table formatting must be converted to HTML tables with <table>, <tr>, <td> tags.\n"
+    "- <Table with Row Striping> is a tag and there is template code for it in the template document.\n"
+    "- <Table with Column Striping> is a tag and there is template code for it in the template document.\n"
+    "- <video> is also a tag with template code in the document. \n"
+    "- There is a possibility of elements within elements. Please add in the code accordingly. \n"
+    "- Keep .bluePageHeader, .header, .divisionLineYellow, .landingPageFooter intact.\n\n"
+    "QUIZ RULES (when <page_type> is 'quiz'):\n"
+    "- Questions appear between <quiz_start> and </quiz_end>.\n"
+    "- <multiple_choice> blocks use '*' prefix to mark correct choices.\n"
+    '- If <shuffle> appears inside a question, set "shuffle": true; else false.\n'
+    "- Question-level feedback tags (optional):\n"
+    "  <feedback_correct>...</feedback_correct>, <feedback_incorrect>...</feedback_incorrect>, <feedback_neutral>...</feedback_neutral>\n"
+    "- Per-answer feedback (optional): '(feedback: ...)' after a choice line or <feedback>A: ...</feedback>.\n"
+    "RETURN:\n"
+    "1) Canvas-ready HTML (no code fences) and no other comments\n"
+    "2) If page_type is 'quiz', append a JSON object at the very END (no extra text) with:\n"
+    "- Support these Canvas-compatible question types:\n"
+    "  multiple_choice_question (single correct), multiple_answers_question (checkboxes), true_false_question, "
+    "  essay_question, short_answer_question (fill-in-one-blank), fill_in_multiple_blanks_question, "
+    "  matching_question, numerical_question.\n"
+    "- Include per-answer feedback when available, and overall feedback via a 'feedback' object "
+    "(keys: 'correct','incorrect','neutral').\n"
+    "JSON SCHEMA EXAMPLES (use only fields relevant to each type; keep it MINIFIED):\n"
+    '{"quiz_description":"<p>Intro...</p>","questions":['
+    # multiple choice
+    '{"question_type":"multiple_choice_question","question_name":"...","question_text":"<p>...</p>",'
+    '"answers":[{"text":"A","is_correct":false,"feedback":"<p>...</p>"},{"text":"B","is_correct":true,"feedback":"<p>...</p>"}],'
+    '"shuffle":true,"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>","neutral":"<p>...</p>"}},'
+    # multiple answers (checkboxes)
+    '{"question_type":"multiple_answers_question","question_name":"...","question_text":"<p>...</p>",'
+    '"answers":[{"text":"A","is_correct":true,"feedback":"<p>...</p>"},{"text":"B","is_correct":true,"feedback":"<p>...</p>"},'
+    '{"text":"C","is_correct":false,"feedback":"<p>...</p>"}],'
+    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
+    # true/false
+    '{"question_type":"true_false_question","question_name":"...","question_text":"<p>...</p>",'
+    '"answers":[{"text":"True","is_correct":false,"feedback":"<p>...</p>"},{"text":"False","is_correct":true,"feedback":"<p>...</p>"}],'
+    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
+    # essay
+    '{"question_type":"essay_question","question_name":"...","question_text":"<p>...</p>",'
+    '"feedback":{"neutral":"<p>Instructor graded.</p>"}},'
+    # short answer (single blank; list acceptable strings)
+    '{"question_type":"short_answer_question","question_name":"...","question_text":"<p>...</p>",'
+    '"answers":[{"text":"chlorophyll"},{"text":"chlorophyl"}],'
+    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
+    # fill in multiple blanks (use {{blank_id}} in question_text; map answers by blank_id)
+    '{"question_type":"fill_in_multiple_blanks_question","question_name":"...","question_text":"<p>H{{b1}}O is {{b2}}.</p>",'
+    '"answers":[{"blank_id":"b1","text":"2","feedback":"<p>...</p>"},{"blank_id":"b2","text":"water","feedback":"<p>...</p>"}]},'
+    # matching
+    '{"question_type":"matching_question","question_name":"...","question_text":"<p>Match:</p>",'
+    '"matches":[{"prompt":"H2O","match":"water","feedback":"<p>...</p>"},{"prompt":"NaCl","match":"salt","feedback":"<p>...</p>"}]},'
+    # numerical (exact or exact+tolerance)
+    '{"question_type":"numerical_question","question_name":"...","question_text":"<p>Speed?</p>",'
+    '"numerical_answer":{"exact":12.5,"tolerance":0.5},'
+    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}}'
+    "]}\n"
+    "]}\n"
+    "COVERAGE (NO-DROP) RULES\n"
+    "- Do not omit or summarize any substantive content from the storyboard block.\n"
+    "- Every sentence/line from the storyboard (between <canvas_page>…</canvas_page>) MUST appear in the output HTML.\n"
+    "- If a piece of storyboard content doesn’t clearly map to a template section, append it as it appears in the storyboard.\n"
+    "- Preserve the original order of content as much as possible.\n"
+    "- Never remove <img>, <table>, or any explicit HTML already present in the storyboard; include them verbatim.\n"
+)
+
+# Full SYSTEM prompts, built once at import instead of on every item/rerun.
+_SYSTEM_COURSE_TEMPLATE = (
+    _BASE_RULES
+    + "\nUse the TEMPLATE HTML verbatim where structure exists. Return HTML only."
+)
+_SYSTEM_KB_TEMPLATE = (
+    _BASE_RULES
+    + "\nUse file_search to locate the best matching template if available. Return HTML only."
+)
+
+
+def _build_chat_payload(
+    p, template_html, vector_store_id, max_tokens, model: str = "gpt-4o"
+) -> dict:
+    """
+    Build the chat.completions payload for a single storyboard item.
+
+    Shared by the online (per-click) path and the Batch API path so both send
+    byte-identical prompts for the same item.
+
+    Parameters:
+        p (dict): Parsed page entry from st.session_state.pages.
+        template_html (str | None): Course template HTML picked for this item.
+        vector_store_id (str | None): Knowledge Base vector store, if any.
+        max_tokens (int): Output token cap.
+        model (str): Chat model chosen in the OpenAI settings.
+
+    Returns:
+        dict: Keyword arguments for client.chat.completions.create().
+    """
+    raw_block = p["raw"]
+
+    tools = None
+    if p["template_source"] == "kb" and vector_store_id:
+        tools = [
+            {
+                "type": "file_search",
+                "vector_store_ids": [vector_store_id],
+            }
+        ]
+
+    # SYSTEM / USER messages
+    if template_html:
+        SYSTEM = _SYSTEM_COURSE_TEMPLATE
+        USER = f"TEMPLATE HTML:\n{template_html}\n\nSTORYBOARD PAGE BLOCK:\n{raw_block}\n"
+    else:
+        SYSTEM = _SYSTEM_KB_TEMPLATE if tools else _BASE_RULES
+        USER = f"STORYBOARD PAGE BLOCK:\n{raw_block}\n"
+
+    # ------------------------------------------------------------------
+    # CORRECT OpenAI SDK v1.x chat.completions.create payload
+    # ------------------------------------------------------------------
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM},
+            {"role": "user", "content": USER},
+        ],
+        "max_tokens": max_tokens,
+    }
+    if tools:
+        payload["tools"] = tools
+    return payload
+
+
+# Bump whenever _BASE_RULES / payload construction changes, so memoised GPT
+# output produced by an older prompt is never reused.
+_PROMPT_VERSION = "v1"
+
+# Upper bound on memoised GPT responses kept in-process (oldest evicted first).
+_GPT_MEMO_MAX = 512
+
+
+@st.cache_resource(show_spinner=False)
+def _openai_client(api_key: str):
+    """
+    One OpenAI client per API key for the whole process.
+
+    ensure_client() builds a fresh httpx pool each call; caching it keeps
+    connections to api.openai.com alive across reruns and GPT calls.
+    """
+    return ensure_client(api_key)
+
+
+@st.cache_resource(show_spinner=False)
+def _gpt_memo() -> dict:
+    """Process-wide memo of GPT output, keyed by _payload_key()."""
+    return {}
+
+
+def _payload_key(payload: dict) -> str:
+    """Stable content hash of a chat.completions payload (+ prompt version)."""
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{_PROMPT_VERSION}\n{blob}".encode("utf-8")).hexdigest()
+
+
+def _gpt_memo_get(payload: dict):
+    return _gpt_memo().get(_payload_key(payload))
+
+
+_GPT_MEMO_LOCK = threading.Lock()
+
+
+def _gpt_memo_put(payload: dict, content: str, finish_reason=None) -> None:
+    # Truncated output (hit max_tokens) is never reused; "Regenerate" or a
+    # higher token cap must be able to produce a complete answer.
+    if not content or finish_reason == "length":
+        return
+    memo = _gpt_memo()
+    key = _payload_key(payload)
+    # Shared across sessions (script threads), so guard the evict loop.
+    with _GPT_MEMO_LOCK:
+        memo[key] = content
+        while len(memo) > _GPT_MEMO_MAX:
+            memo.pop(next(iter(memo)))
+
+
+def _upload_key(p: dict, html_result: str, quiz_json) -> str:
+    """
+    Content hash identifying one Canvas upload (type, module, title, body, quiz).
+    """
+    blob = json.dumps(
+        [p["page_type"], p["module_name"], p["page_title"], html_result, quiz_json],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+@st.cache_resource(show_spinner=False)
+def _openai_rate_limiter(
+    api_key: str, model: str, rpm: float, tpm: float
+) -> OpenAIRateLimiter:
+    """
+    One RPM/TPM limiter per API key + model (+ configured limits) for the
+    whole process, so every GPT call of every click shares one budget.
+    """
+    return OpenAIRateLimiter(rpm, tpm)
+
+
+def _gpt_limiter(model: str):
+    """Shared limiter for the current key/model, or None if pacing is off."""
+    rpm = st.session_state.get("gpt_rpm")
+    tpm = st.session_state.get("gpt_tpm")
+    if not (rpm and tpm):
+        return None
+    api_key = st.session_state.get("_openai_key") or os.getenv("OPENAI_API_KEY", "")
+    return _openai_rate_limiter(api_key, model, float(rpm), float(tpm))
+
+
+def _chat_complete_many(client, payloads, max_workers: int, use_memo: bool = True):
+    """
+    Run several chat.completions payloads, up to max_workers at a time.
+
+    Memo lookups and session-state reads happen here on the calling (script)
+    thread; worker threads (gpt_parallel.complete_many) only talk to OpenAI
+    and never touch Streamlit. One failing request does not affect the others.
+
+    Parameters:
+        use_memo (bool): False skips memoised output and always calls OpenAI
+            (the "Regenerate" toggle).
+
+    Returns:
+        list[tuple[str | None, Exception | None, str | None]]:
+        (content, error, finish_reason) per payload, in input order
+        (finish_reason is None for memoised output).
+    """
+    out = [
+        ((_gpt_memo_get(payload) if use_memo else None), None, None)
+        for payload in payloads
+    ]
+
+    # Identical payloads (e.g. repeated boilerplate blocks) are sent once
+    todo = {}  # payload key → indices sharing it
+    for i, (content, _, _) in enumerate(out):
+        if content is None:
+            todo.setdefault(_payload_key(payloads[i]), []).append(i)
+
+    if todo:
+        groups = list(todo.values())
+        # Paced against the account's RPM/TPM, retried on 429/5xx/timeouts
+        results = complete_many(
+            client,
+            [payloads[g[0]] for g in groups],
+            max_workers,
+            limiter=_gpt_limiter(payloads[0].get("model", "")),
+        )
+        for group, result in zip(groups, results):
+            for i in group:
+                out[i] = result
+    return out
+
+
+# Re-render the live preview every N streamed characters (not every token),
+# so Streamlit's websocket isn't flooded on long pages.
+_STREAM_RENDER_EVERY = 400
+
+
+def _stream_chat_completion(client, payload: dict, placeholder, label: str = ""):
+    """
+    Run a chat.completions request with stream=True, echoing the partial
+    output into a Streamlit placeholder as it arrives.
+
+    Paced by the shared RPM/TPM limiter and retried on transient errors
+    (gpt_parallel.stream_with_retry), like the concurrent path.
+
+    Returns:
+        tuple[str, str | None]: The full assistant text (same as
+        message.content when not streaming) and the finish_reason.
+    """
+    chunks = []
+    state = {"size": 0, "rendered": 0}
+
+    def _on_delta(delta: str) -> None:
+        chunks.append(delta)
+        state["size"] += len(delta)
+        if state["size"] - state["rendered"] >= _STREAM_RENDER_EVERY:
+            state["rendered"] = state["size"]
+            placeholder.code(f"⏳ {label}\n\n" + "".join(chunks), language="html")
+
+    return stream_with_retry(
+        client,
+        payload,
+        limiter=_gpt_limiter(payload.get("model", "")),
+        on_delta=_on_delta,
+    )
+
+
+def _strip_fences(content: str) -> str:
+    """Remove ```/```html/```json fences (regex only runs when one is present)."""
+    if "```" in content:
+        content = _FENCE_RE.sub("", content)
+    return content.strip()
+
+
+def _tail_json_start(text: str):
+    """
+    Index of the '{' opening the JSON object that ends text, or None.
+
+    Walks backwards from the final '}' counting braces (ignoring any inside
+    double-quoted strings), so only the JSON tail is scanned — no regex
+    backtracking over the HTML in front of it.
+    """
+    i = len(text) - 1
+    if i < 0 or text[i] != "}":
+        return None
+
+    depth = 0
+    in_str = False
+    while i >= 0:
+        c = text[i]
+        if c == '"':
+            j = i - 1
+            while j >= 0 and text[j] == "\\":
+                j -= 1
+            if (i - 1 - j) % 2 == 0:  # not escaped
+                in_str = not in_str
+        elif not in_str:
+            if c == "}":
+                depth += 1
+            elif c == "{":
+                depth -= 1
+                if depth == 0:
+                    return i
+        i -= 1
+    return None
+
+
+def _split_html_and_quiz(content: str, page_type: str) -> dict:
+    """
+    Clean raw model output into {"html", "quiz_json"}.
+
+    Strips code fences and, for quiz items, peels the trailing JSON object off
+    the end of the HTML.
+    """
+    cleaned = _strip_fences(content)
+    quiz_json = None
+    html_result = cleaned
+
+    # Extract JSON (quiz only)
+    if page_type == "quiz":
+        start = _tail_json_start(cleaned)
+        if start is not None:
+            try:
+                quiz_json = json.loads(cleaned[start:])
+                html_result = cleaned[:start].strip()
+            except Exception:
+                quiz_json = None
+
+    return {"html": html_result, "quiz_json": quiz_json}
+
+
+def _memoizable(result: dict, page_type: str) -> bool:
+    """False for quiz output whose trailing JSON did not parse (worth a retry)."""
+    return page_type != "quiz" or result["quiz_json"] is not None
+
+
+def _build_group_chat_payload(
+    items, vector_store_id, max_tokens, model: str = "gpt-4o"
+) -> dict:
+    """
+    Build one chat.completions payload covering several storyboard items.
+
+    The SYSTEM rules are sent once for the whole group instead of once per
+    item, and the model is asked for a JSON object of the form
+    {"items": [{"index", "html", "quiz_json"}, ...]} so results can be routed
+    back to their page index.
+
+    Parameters:
+        items (list[tuple[int, dict, str | None]]):
+            (page index, parsed page entry, course template HTML or None).
+        vector_store_id (str | None): Knowledge Base vector store, if any.
+        max_tokens (int): Output token cap *per item*; scaled by group size.
+        model (str): Chat model chosen in the OpenAI settings.
+
+    Returns:
+        dict: Keyword arguments for client.chat.completions.create().
+    """
+    use_kb = bool(vector_store_id) and any(
+        p["template_source"] == "kb" for _, p, _ in items
+    )
+
+    SYSTEM = _BASE_RULES + (
+        "\nYou will receive several STORYBOARD PAGE BLOCKs, each labelled with an index."
+        "\nApply the rules above to every block independently."
+        "\nWhere a block has its own TEMPLATE HTML, use it verbatim where structure exists."
+        + (
+            "\nOtherwise use file_search to locate the best matching template if available."
+            if use_kb
+            else ""
+        )
+        + '\nRespond with a single JSON object: {"items":[{"index":<int>,"html":"<Canvas HTML>",'
+        '"quiz_json":<quiz object or null>}, ...]} with exactly one element per block.'
+        "\nFor quiz blocks put the quiz JSON in quiz_json instead of appending it to the HTML."
+    )
+
+    parts = []
+    for idx, p, template_html in items:
+        block = f"=== BLOCK index={idx} (page_type={p['page_type']}) ===\n"
+        if template_html:
+            block += f"TEMPLATE HTML:\n{template_html}\n\n"
+        block += f"STORYBOARD PAGE BLOCK:\n{p['raw']}\n"
+        parts.append(block)
+    USER = "\n".join(parts)
+
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM},
+            {"role": "user", "content": USER},
+        ],
+        "max_tokens": min(int(max_tokens) * len(items), 16384),
+        "response_format": {"type": "json_object"},
+    }
+    if use_kb:
+        payload["tools"] = [
+            {"type": "file_search", "vector_store_ids": [vector_store_id]}
+        ]
+    return payload
+
+
+def _split_group_results(content: str, pages_by_idx: dict) -> dict:
     """
-    Wrapper around client.responses.create with exponential backoff for 429/5xx.
-    Returns output_text (empty string if missing).
+    Route a grouped response back to per-item {"html", "quiz_json"} results.
+
+    Accepts either {"items": [...]} or a bare JSON array. Entries whose index
+    is unknown, or whose HTML is missing, are dropped so the caller can fall
+    back to a single-item request for them.
     """
-    delay = 1.5
-    for _ in range(6):
+    cleaned = _strip_fences(content or "")
+    try:
+        data = json.loads(cleaned)
+    except Exception:
+        return {}
+    if isinstance(data, dict):
+        data = data.get("items") or []
+    if not isinstance(data, list):
+        return {}
+
+    out = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
         try:
-            resp = client.responses.create(**kwargs)
-            return getattr(resp, "output_text", "") or ""
-        except RateLimitError:
-            time.sleep(delay)
-            delay *= 1.8
-        except APIError as e:
-            code = getattr(e, "status_code", 500)
-            if code and int(code) >= 500:
-                time.sleep(delay)
-                delay *= 1.8
-            else:
-                raise
-    resp = client.responses.create(**kwargs)
-    return getattr(resp, "output_text", "") or ""
+            idx = int(entry.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if idx not in pages_by_idx or not entry.get("html"):
+            continue
+
+        quiz_json = entry.get("quiz_json")
+        if isinstance(quiz_json, str):
+            try:
+                quiz_json = json.loads(quiz_json)
+            except Exception:
+                quiz_json = None
+        if pages_by_idx[idx]["page_type"] != "quiz" or not isinstance(quiz_json, dict):
+            quiz_json = None
+
+        out[idx] = {"html": entry["html"].strip(), "quiz_json": quiz_json}
+    return out
+
+
+@st.cache_data(show_spinner=False)
+def _storyboard_text_from_bytes(docx_bytes: bytes) -> str:
+    """
+    Cached DOCX → text flattening, keyed on the file content.
+
+    Streamlit hashes the bytes once per call, so rescanning the same
+    storyboard (or any rerun that re-reads it) skips python-docx entirely.
+    """
+    return docx_bytes_to_text(docx_bytes)
+
+
+@st.cache_data(show_spinner=False)
+def _parse_storyboard_module(tag_text: str, tag_name: str):
+    """
+    Cached storyboard-module → page entries, keyed on the module text.
+
+    Runs the tag diagnostics, <canvas_page> extraction and per-block metadata
+    parsing once per distinct module; re-parsing the same module is a cache
+    hit. st.cache_data returns a fresh copy each call, so callers may edit
+    the returned entries in place.
+
+    Returns:
+        tuple[dict, list[dict]]: (scan_canvas_page_tags() result, page entries)
+    """
+    diag = scan_canvas_page_tags(tag_text)
+    raw_pages = extract_canvas_pages_from_text(tag_text)
+
+    # Build items with default module = selected module name
+    last_known_module = tag_name or "General"
+    type_options = ("page", "assignment", "discussion", "quiz")
+
+    pages = []
+    for idx, block in enumerate(raw_pages):
+        tags = extract_tags(_PAGE_META_TAGS, block)
+
+        # robust normalization (prevents ValueError later)
+        raw_page_type = tags.get("page_type", "")
+        page_type = (raw_page_type or "page").strip().lower()
+        if page_type not in type_options:
+            page_type = "page"
+
+        page_title = (tags.get("page_title") or f"Page {idx+1}").strip()
+        module_name = (tags.get("module_name") or last_known_module or "General").strip()
+        page_template_name = (tags.get("page_template") or "").strip()
+        last_known_module = module_name
+
+        pages.append(
+            {
+                "index": idx,
+                "raw": block,
+                "page_type": page_type,
+                "page_title": page_title,
+                "module_name": module_name,
+                "page_template_from_doc": page_template_name,
+                "template_source": "kb",
+                "template_module_id": None,
+                "template_course_item": None,
+            }
+        )
+    return diag, pages
+
+
+# Workflow stage shown in the trailing guidance hint
+UI_NO_MODULE = "no_module"
+UI_UNPARSED = "unparsed"
+UI_READY_VISUALIZE = "ready_visualize"
+UI_DONE = "done"
+
+_GUIDANCE = {
+    UI_NO_MODULE: (
+        "info",
+        "Scan for `<module_name>…</module>` tags and pick a module, then click **Parse storyboard**.",
+        "📝",
+    ),
+    UI_UNPARSED: (
+        "warning",
+        "Click **Parse storyboard** to extract the items in the chosen module.",
+        "👉",
+    ),
+    UI_READY_VISUALIZE: (
+        "info",
+        "Review & adjust metadata above (and pick course templates if desired), then click **Visualize selected**.",
+        "🔎",
+    ),
+}
+
+
+def _classify_ui_state(state) -> str:
+    """Map session state to a single workflow stage (read once per rerun)."""
+    if not state.get("selected_tag_module_text"):
+        return UI_NO_MODULE
+    if not state.get("pages"):
+        return UI_UNPARSED
+    if not state.get("visualized"):
+        return UI_READY_VISUALIZE
+    return UI_DONE
 
 
 def main():
@@ -194,16 +776,8 @@ def main():
 
         def _read_entire_doc_as_text() -> str:
             """Return storyboard as plain text (from uploaded DOCX or export of GDoc)."""
-            try:
-                from docx import Document  # python-docx
-            except Exception:
-                st.error(
-                    "python-docx is required. Add `python-docx` to requirements.txt."
-                )
-                return ""
-
             if uploaded_file is not None:
-                doc = Document(uploaded_file)
+                docx_bytes = read_docx_bytes(uploaded_file)
             elif gdoc_url and st.session_state.get("_sa_bytes"):
                 fid = gdoc_id_from_url(gdoc_url)
                 if not fid:
@@ -211,14 +785,18 @@ def main():
                     return ""
                 try:
                     buf = fetch_docx_from_gdoc(fid, st.session_state["_sa_bytes"])
-                    doc = Document(buf)
+                    docx_bytes = read_docx_bytes(buf)
                 except Exception as e:
-                    st.error(f"❌ Could not fetch/read Google Doc as DOCX: {e}")
+                    st.error(f"❌ Could not fetch Google Doc as DOCX: {e}")
                     return ""
             else:
                 return ""
 
-            return "\n".join(p.text for p in doc.paragraphs)
+            try:
+                return _storyboard_text_from_bytes(docx_bytes)
+            except Exception as e:
+                st.error(f"❌ Could not read storyboard DOCX: {e}")
+                return ""
 
         with scan_col:
             if st.button(
@@ -265,7 +843,9 @@ def main():
                 "Vector Store ID", value=st.session_state.get("vector_store_id") or ""
             )
         with kb2:
-            kb_docx = st.file_uploader("Upload template DOCX", type=["docx"])
+            kb_docxs = st.file_uploader(
+                "Upload template DOCX(s)", type=["docx"], accept_multiple_files=True
+            )
         with kb3:
             kb_gdoc_url = st.text_input("Template Google Doc URL")
         with kb4:
@@ -283,7 +863,7 @@ def main():
 
         if openai_key:
             try:
-                kb_client = ensure_client(openai_key)
+                kb_client = _openai_client(openai_key)
                 kb_supported = vector_store_supported(kb_client)
             except Exception as e:
                 st.warning(f"OpenAI client not ready: {e}")
@@ -326,16 +906,19 @@ def main():
                     vs_id = (
                         st.session_state.get("vector_store_id") or existing_vs
                     ).strip()
-                    got = None
-                    if kb_docx is not None:
-                        got = (BytesIO(kb_docx.getvalue()), kb_docx.name)
-                    elif kb_gdoc_url and st.session_state.get("_sa_bytes"):
+                    # UploadedFile is already a seekable file-like: hand it to
+                    # the SDK directly instead of copying it into a new BytesIO.
+                    got = []
+                    for f in kb_docxs or []:
+                        f.seek(0)
+                        got.append((f, f.name))
+                    if kb_gdoc_url and st.session_state.get("_sa_bytes"):
                         fid = gdoc_id_from_url(kb_gdoc_url)
                         if fid:
                             data = fetch_docx_from_gdoc(
                                 fid, st.session_state["_sa_bytes"]
                             )
-                            got = (data, "template_from_gdoc.docx")
+                            got.append((data, "template_from_gdoc.docx"))
                     if not vs_id:
                         st.error("Vector Store ID missing.")
                     elif not got:
@@ -343,11 +926,18 @@ def main():
                             "Provide a template .docx or Google Doc URL + SA JSON."
                         )
                     else:
-                        data, fname = got
-                        res = upload_file_to_vs(kb_client, vs_id, data, fname)
+                        # All files go up as one vector-store file batch
+                        res = upload_files_to_vs(kb_client, vs_id, got)
                         status, via = res.get("status"), res.get("via", "?")
-                        if status == "completed":
-                            st.success(f"✅ Template uploaded ({via}).")
+                        failed = res.get("failed", 0)
+                        if status == "completed" and failed:
+                            st.warning(
+                                f"⚠️ {res.get('completed', 0)} of {len(got)} template(s) "
+                                f"indexed; {failed} failed to index ({via})."
+                            )
+                        elif status == "completed":
+                            done = res.get("completed", len(got))
+                            st.success(f"✅ {done} template(s) uploaded ({via}).")
                         elif status == "uploaded_file_only_no_vector_store_support":
                             st.warning(
                                 "File uploaded to OpenAI, but Vector Stores aren’t supported in this SDK.\n"
@@ -355,9 +945,11 @@ def main():
                                 f"File id: {res.get('file_id')}"
                             )
                         else:
-                            st.error(
-                                f"Upload error ({via}): {res.get('error', 'unknown')}"
+                            detail = res.get("error") or (
+                                f"batch {status}: {res.get('completed', 0)} indexed, "
+                                f"{failed} failed"
                             )
+                            st.error(f"Upload error ({via}): {detail}")
                 except Exception as e:
                     st.error(f"Upload failed: {e}")
 
@@ -396,6 +988,17 @@ def main():
                 st.session_state.course_modules = [
                     {"id": m["id"], "name": m["name"]} for m in mods
                 ]
+                # Refresh the upload-time module cache from this same listing
+                # (replaces it, so stale ids from an earlier load are dropped)
+                prefetch_module_cache(
+                    canvas_domain,
+                    course_id,
+                    canvas_token,
+                    st.session_state.module_cache_by_course.setdefault(
+                        f"{canvas_domain}|{course_id}", {}
+                    ),
+                    modules=mods,
+                )
                 st.success(f"Loaded {len(mods)} module(s) from the course.")
             except Exception as e:
                 st.error(f"Failed to load modules: {e}")
@@ -433,6 +1036,66 @@ def main():
                 step=0.1,
             )
 
+        st.session_state["gpt_group_size"] = st.number_input(
+            "Pages per GPT request",
+            min_value=1,
+            max_value=8,
+            value=1,
+            step=1,
+            help="Values above 1 send several storyboard blocks in one request, "
+            "sharing the system prompt. Blocks the model drops are retried individually.",
+        )
+
+        st.session_state["gpt_workers"] = st.number_input(
+            "Parallel GPT requests",
+            min_value=1,
+            max_value=8,
+            value=1,
+            step=1,
+            help="Values above 1 generate several items concurrently (no live "
+            "streaming preview). Keep within your OpenAI rate limits.",
+        )
+
+        # Off by default: each request is charged its full max_tokens, so
+        # pacing at modest limits would slow even a plain sequential run.
+        pace = st.checkbox(
+            "⏱️ Pace GPT requests to my OpenAI rate limits",
+            value=False,
+            help="Only needed if you hit 429 rate-limit errors. Requests are "
+            "spaced to stay under the limits below (output is counted at "
+            "max tokens, as OpenAI does).",
+        )
+        st.session_state["gpt_rpm"] = st.session_state["gpt_tpm"] = None
+        if pace:
+            r1, r2 = st.columns([1, 1])
+            with r1:
+                st.session_state["gpt_rpm"] = st.number_input(
+                    "Max requests / minute",
+                    min_value=1,
+                    max_value=30000,
+                    value=500,
+                    step=50,
+                    help="Requests are paced to stay under your OpenAI "
+                    "account's RPM limit.",
+                )
+            with r2:
+                st.session_state["gpt_tpm"] = st.number_input(
+                    "Max tokens / minute",
+                    min_value=1000,
+                    max_value=30000000,
+                    value=30000,
+                    step=1000,
+                    help="Estimated prompt + output tokens are paced to stay "
+                    "under your OpenAI account's TPM limit.",
+                )
+
+        st.session_state["gpt_batch_mode"] = st.checkbox(
+            "🗂️ Batch mode (OpenAI Batch API — cheaper, results within 24h)",
+            value=False,
+            help="Submit all selected items as one batch job, then use "
+            "**Check batch** to collect results. Recommended for large storyboards.",
+        )
+
     # ──────────────────────────────────────────────────────────────────────────────
     # 5) Other settings
     # ──────────────────────────────────────────────────────────────────────────────
@@ -460,59 +1123,25 @@ def main():
             st.session_state.pages.clear()
             st.session_state.gpt_results.clear()
             st.session_state.visualized = False
+            st.session_state.gpt_batch = None
             st.session_state.per_item_course_template_html.clear()
             st.session_state.upload_selected.clear()
 
             tag_text = st.session_state.get("selected_tag_module_text")
             tag_name = st.session_state.get("selected_tag_module_name")
 
+            diag, parsed = _parse_storyboard_module(tag_text or "", tag_name or "")
             if tag_text:
-                diag = scan_canvas_page_tags(tag_text)
                 st.caption(
                     f"Canvas-page tags → start: {diag['starts']}  "
                     f"end: {diag['ends']}  balanced: {diag['balanced']}"
                 )
-            raw_pages = extract_canvas_pages_from_text(tag_text) if tag_text else []
-            if not raw_pages:
+            if not parsed:
                 st.warning(
                     "No <canvas_page> blocks found in this module. Tags are case-insensitive. Example:\n"
                     "<canvas_page> ... </canvas_page>"
                 )
-            raw_pages = extract_canvas_pages_from_text(tag_text) if tag_text else []
-
-            # Build items with default module = selected module name
-            last_known_module = tag_name or "General"
-            TYPE_OPTIONS = ["page", "assignment", "discussion", "quiz"]
-
-            for idx, block in enumerate(raw_pages):
-                # robust normalization (prevents ValueError later)
-                raw_page_type = extract_tag("page_type", block)
-                page_type = (raw_page_type or "page").strip().lower()
-                if page_type not in TYPE_OPTIONS:
-                    page_type = "page"
-
-                page_title = (
-                    extract_tag("page_title", block) or f"Page {idx+1}"
-                ).strip()
-                module_name = (
-                    extract_tag("module_name", block) or last_known_module or "General"
-                ).strip()
-                page_template_name = (extract_tag("page_template", block) or "").strip()
-                last_known_module = module_name
-
-                st.session_state.pages.append(
-                    {
-                        "index": idx,
-                        "raw": block,
-                        "page_type": page_type,
-                        "page_title": page_title,
-                        "module_name": module_name,
-                        "page_template_from_doc": page_template_name,
-                        "template_source": "kb",
-                        "template_module_id": None,
-                        "template_course_item": None,
-                    }
-                )
+            st.session_state.pages.extend(parsed)
 
             st.success(
                 f"✅ Parsed {len(st.session_state.pages)} item(s) from '{tag_name}'."
@@ -820,6 +1449,13 @@ def main():
             if checked:
                 selected_indices.append(i)
 
+        regenerate = st.checkbox(
+            "♻️ Regenerate (ignore cached GPT output)",
+            key="gpt_regenerate",
+            help="Call OpenAI again for the selected items instead of reusing "
+            "output memoised from an earlier identical request.",
+        )
+
         if st.button(
             "🔎 Visualize selected (no upload)",
             type="primary",
@@ -839,175 +1475,269 @@ def main():
                 st.stop()
 
             st.session_state["_openai_key"] = openai_key
-            client = ensure_client(openai_key)
+            client = _openai_client(openai_key)
 
             # ------------------------------------------------------------------
-            # Process each selected item
+            # Batch mode: one JSONL job for all selected items
             # ------------------------------------------------------------------
-            for idx in selected_indices:
-                p = st.session_state.pages[idx]
-                raw_block = p["raw"]
-
-                # DO NOT CHANGE THIS BLOCK (base_rules) – kept exactly as provided
-                base_rules = (
-                    "You are an expert Canvas HTML generator.\n"
-                    "- Preserve ALL <a href> links and any <img> or <table> in the storyboard.\n"
-                    "- Replace only inner content of template areas; keep structure/classes/attributes intact.\n"
-                    "  if a section has no content, remove the template section in place; append extra sections at the end.\n"
-                    "- if a section does not exist in the template, create it with the same structure.\n"
-                    "- <element_type> tags are used to mark template code associations found within the file_search.\n"
-                    "- If some content does not map, append it as it appears in the storyboard."
-                    "- if a section does not exist in the template, create it with the same structure.\n"
-                    "- <element_type> tags are used to mark template code associations found within the file_search.\n"
-                    "- <accordion_title> are used for the summary tag in html accordions.\n"
-                    "- <accordion_content> are used for the content inside the accordion.\n"
-                    "- table formatting must be converted to HTML tables with <table>, <tr>, <td> tags.\n"
-                    "- <Table with Row Striping> is a tag and there is template code for it in the template document.\n"
-                    "- <Table with Column Striping> is a tag and there is template code for it in the template document.\n"
-                    "- <video> is also a tag with template code in the document. \n"
-                    "- There is a possibility of elements within elements. Please add in the code accordingly. \n"
-                    "- Keep .bluePageHeader, .header, .divisionLineYellow, .landingPageFooter intact.\n\n"
-                    "QUIZ RULES (when <page_type> is 'quiz'):\n"
-                    "- Questions appear between <quiz_start> and </quiz_end>.\n"
-                    "- <multiple_choice> blocks use '*' prefix to mark correct choices.\n"
-                    '- If <shuffle> appears inside a question, set "shuffle": true; else false.\n'
-                    "- Question-level feedback tags (optional):\n"
-                    "  <feedback_correct>...</feedback_correct>, <feedback_incorrect>...</feedback_incorrect>, <feedback_neutral>...</feedback_neutral>\n"
-                    "- Per-answer feedback (optional): '(feedback: ...)' after a choice line or <feedback>A: ...</feedback>.\n"
-                    "RETURN:\n"
-                    "1) Canvas-ready HTML (no code fences) and no other comments\n"
-                    "2) If page_type is 'quiz', append a JSON object at the very END (no extra text) with:\n"
-                    "- Support these Canvas-compatible question types:\n"
-                    "  multiple_choice_question (single correct), multiple_answers_question (checkboxes), true_false_question, "
-                    "  essay_question, short_answer_question (fill-in-one-blank), fill_in_multiple_blanks_question, "
-                    "  matching_question, numerical_question.\n"
-                    "- Include per-answer feedback when available, and overall feedback via a 'feedback' object "
-                    "(keys: 'correct','incorrect','neutral').\n"
-                    "JSON SCHEMA EXAMPLES (use only fields relevant to each type; keep it MINIFIED):\n"
-                    '{"quiz_description":"<p>Intro...</p>","questions":['
-                    # multiple choice
-                    '{"question_type":"multiple_choice_question","question_name":"...","question_text":"<p>...</p>",'
-                    '"answers":[{"text":"A","is_correct":false,"feedback":"<p>...</p>"},{"text":"B","is_correct":true,"feedback":"<p>...</p>"}],'
-                    '"shuffle":true,"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>","neutral":"<p>...</p>"}},'
-                    # multiple answers (checkboxes)
-                    '{"question_type":"multiple_answers_question","question_name":"...","question_text":"<p>...</p>",'
-                    '"answers":[{"text":"A","is_correct":true,"feedback":"<p>...</p>"},{"text":"B","is_correct":true,"feedback":"<p>...</p>"},'
-                    '{"text":"C","is_correct":false,"feedback":"<p>...</p>"}],'
-                    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
-                    # true/false
-                    '{"question_type":"true_false_question","question_name":"...","question_text":"<p>...</p>",'
-                    '"answers":[{"text":"True","is_correct":false,"feedback":"<p>...</p>"},{"text":"False","is_correct":true,"feedback":"<p>...</p>"}],'
-                    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
-                    # essay
-                    '{"question_type":"essay_question","question_name":"...","question_text":"<p>...</p>",'
-                    '"feedback":{"neutral":"<p>Instructor graded.</p>"}},'
-                    # short answer (single blank; list acceptable strings)
-                    '{"question_type":"short_answer_question","question_name":"...","question_text":"<p>...</p>",'
-                    '"answers":[{"text":"chlorophyll"},{"text":"chlorophyl"}],'
-                    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}},'
-                    # fill in multiple blanks (use {{blank_id}} in question_text; map answers by blank_id)
-                    '{"question_type":"fill_in_multiple_blanks_question","question_name":"...","question_text":"<p>H{{b1}}O is {{b2}}.</p>",'
-                    '"answers":[{"blank_id":"b1","text":"2","feedback":"<p>...</p>"},{"blank_id":"b2","text":"water","feedback":"<p>...</p>"}]},'
-                    # matching
-                    '{"question_type":"matching_question","question_name":"...","question_text":"<p>Match:</p>",'
-                    '"matches":[{"prompt":"H2O","match":"water","feedback":"<p>...</p>"},{"prompt":"NaCl","match":"salt","feedback":"<p>...</p>"}]},'
-                    # numerical (exact or exact+tolerance)
-                    '{"question_type":"numerical_question","question_name":"...","question_text":"<p>Speed?</p>",'
-                    '"numerical_answer":{"exact":12.5,"tolerance":0.5},'
-                    '"feedback":{"correct":"<p>...</p>","incorrect":"<p>...</p>"}}'
-                    "]}\n"
-                    "]}\n"
-                    "COVERAGE (NO-DROP) RULES\n"
-                    "- Do not omit or summarize any substantive content from the storyboard block.\n"
-                    "- Every sentence/line from the storyboard (between <canvas_page>…</canvas_page>) MUST appear in the output HTML.\n"
-                    "- If a piece of storyboard content doesn’t clearly map to a template section, append it as it appears in the storyboard.\n"
-                    "- Preserve the original order of content as much as possible.\n"
-                    "- Never remove <img>, <table>, or any explicit HTML already present in the storyboard; include them verbatim.\n"
+            if st.session_state.get("gpt_batch_mode"):
+                batch_requests = []
+                for idx in selected_indices:
+                    p = st.session_state.pages[idx]
+                    template_html = None
+                    if p["template_source"] == "course":
+                        template_html = (
+                            st.session_state.per_item_course_template_html.get(idx)
+                        )
+                    batch_requests.append(
+                        (
+                            f"page_{idx}",
+                            _build_chat_payload(
+                                p,
+                                template_html,
+                                st.session_state.get("vector_store_id"),
+                                st.session_state.get("gpt_max_tokens", 2000),
+                                st.session_state.get("gpt_model", "gpt-4o"),
+                            ),
+                        )
+                    )
+                try:
+                    batch_id = submit_batch(
+                        client,
+                        build_batch_jsonl(batch_requests),
+                        description=st.session_state.get("selected_tag_module_name")
+                        or "",
+                    )
+                except Exception as e:
+                    st.error(f"Batch submission failed: {e}")
+                    st.stop()
+
+                st.session_state.gpt_batch = {
+                    "id": batch_id,
+                    "indices": list(selected_indices),
+                }
+                st.session_state["gpt_batch_notice"] = (
+                    f"🗂️ Batch submitted (`{batch_id}`) with {len(batch_requests)} "
+                    "item(s). Use **Check batch** to collect results."
                 )
+                # Rerun so the Check batch button (rendered further down)
+                # appears straight away.
+                st.rerun()
 
+            # ------------------------------------------------------------------
+            # Grouped prompts: K items per request, shared SYSTEM prompt
+            # ------------------------------------------------------------------
+            group_size = int(st.session_state.get("gpt_group_size", 1) or 1)
+            gpt_workers = int(st.session_state.get("gpt_workers", 1) or 1)
+            remaining = list(selected_indices)
+            if group_size > 1 and len(remaining) > 1:
+                groups = []
+                for start in range(0, len(remaining), group_size):
+                    group = remaining[start : start + group_size]
+                    items = [
+                        (
+                            idx,
+                            st.session_state.pages[idx],
+                            st.session_state.per_item_course_template_html.get(idx)
+                            if st.session_state.pages[idx]["template_source"]
+                            == "course"
+                            else None,
+                        )
+                        for idx in group
+                    ]
+                    payload = _build_group_chat_payload(
+                        items,
+                        st.session_state.get("vector_store_id"),
+                        st.session_state.get("gpt_max_tokens", 2000),
+                        st.session_state.get("gpt_model", "gpt-4o"),
+                    )
+                    groups.append((group, items, payload))
+
+                leftovers = []
+                outputs = _chat_complete_many(
+                    client,
+                    [payload for _, _, payload in groups],
+                    gpt_workers,
+                    use_memo=not regenerate,
+                )
+                for (group, items, payload), (content, err, finish) in zip(
+                    groups, outputs
+                ):
+                    if err is not None:
+                        st.warning(f"Grouped GPT call failed, retrying per item: {err}")
+                        content = ""
+
+                    results = _split_group_results(
+                        content, {idx: p for idx, p, _ in items}
+                    )
+                    if len(results) == len(items) and all(
+                        _memoizable(r, st.session_state.pages[idx]["page_type"])
+                        for idx, r in results.items()
+                    ):
+                        _gpt_memo_put(payload, content, finish)
+                    st.session_state.gpt_results.update(results)
+                    leftovers.extend(idx for idx in group if idx not in results)
+                remaining = leftovers
+
+            # ------------------------------------------------------------------
+            # Process each selected item
+            # ------------------------------------------------------------------
+            payloads = []
+            for idx in remaining:
+                p = st.session_state.pages[idx]
                 template_html = None
                 if p["template_source"] == "course":
                     template_html = st.session_state.per_item_course_template_html.get(
                         idx
                     )
+                payloads.append(
+                    _build_chat_payload(
+                        p,
+                        template_html,
+                        st.session_state.get("vector_store_id"),
+                        st.session_state.get("gpt_max_tokens", 2000),
+                        st.session_state.get("gpt_model", "gpt-4o"),
+                    )
+                )
 
-                tools = None
-                if p["template_source"] == "kb" and st.session_state.get(
-                    "vector_store_id"
+            if gpt_workers > 1 and len(remaining) > 1:
+                # Concurrent, non-streamed calls (previews appear below)
+                with st.spinner(
+                    f"Generating {len(remaining)} item(s), {gpt_workers} at a time…"
                 ):
-                    tools = [
-                        {
-                            "type": "file_search",
-                            "vector_store_ids": [st.session_state["vector_store_id"]],
-                        }
-                    ]
-
-                # SYSTEM / USER messages
-                if template_html:
-                    SYSTEM = (
-                        base_rules
-                        + "\nUse the TEMPLATE HTML verbatim where structure exists. Return HTML only."
-                    )
-                    USER = f"TEMPLATE HTML:\n{template_html}\n\nSTORYBOARD PAGE BLOCK:\n{raw_block}\n"
-                else:
-                    SYSTEM = base_rules + (
-                        "\nUse file_search to locate the best matching template if available. Return HTML only."
-                        if tools
-                        else ""
+                    outputs = _chat_complete_many(
+                        client, payloads, gpt_workers, use_memo=not regenerate
                     )
-                    USER = f"STORYBOARD PAGE BLOCK:\n{raw_block}\n"
-
-                # ------------------------------------------------------------------
-                # CORRECT OpenAI SDK v1.x chat.completions.create payload
-                # ------------------------------------------------------------------
-                payload = {
-                    "model": "gpt-4o",
-                    "messages": [
-                        {"role": "system", "content": SYSTEM},
-                        {"role": "user", "content": USER},
-                    ],
-                    "max_tokens": st.session_state.get("gpt_max_tokens", 2000),
-                }
-                if tools:
-                    payload["tools"] = tools
+            else:
+                outputs = [None] * len(remaining)
 
-                # ------------------------------------------------------------------
-                # Call Chat Completions API (correct v1.x)
-                # ------------------------------------------------------------------
-                try:
-                    response = client.chat.completions.create(**payload)
-                    content = response.choices[0].message.content or ""
-                except Exception as e:
-                    st.error(f"GPT error: {e}")
-                    continue
+            for idx, payload, output in zip(remaining, payloads, outputs):
+                p = st.session_state.pages[idx]
 
-                # ------------------------------------------------------------------
-                # Cleanup the model output
-                # ------------------------------------------------------------------
-                cleaned = re.sub(
-                    r"```(html|json)?", "", content, flags=re.IGNORECASE
-                ).strip()
+                finish = None
+                if output is not None:
+                    content, err, finish = output
+                    if err is not None:
+                        st.error(f"GPT error ({p['page_title']}): {err}")
+                        continue
+                else:
+                    # ----------------------------------------------------------
+                    # One at a time: stream into a live preview
+                    # ----------------------------------------------------------
+                    content = None if regenerate else _gpt_memo_get(payload)
+                    if content is None:
+                        live = st.empty()
+                        try:
+                            content, finish = _stream_chat_completion(
+                                client, payload, live, label=p["page_title"]
+                            )
+                        except Exception as e:
+                            live.empty()
+                            st.error(f"GPT error: {e}")
+                            continue
+                        live.empty()
 
-                # Extract JSON (quiz only)
-                json_match = re.search(r"({[\s\S]+})\s*$", cleaned)
-                quiz_json = None
-                html_result = cleaned
-
-                if json_match and p["page_type"] == "quiz":
-                    try:
-                        quiz_json = json.loads(json_match.group(1))
-                        html_result = cleaned[: json_match.start()].strip()
-                    except Exception:
-                        quiz_json = None
-
-                st.session_state.gpt_results[idx] = {
-                    "html": html_result,
-                    "quiz_json": quiz_json,
-                }
+                if finish == "length":
+                    st.warning(
+                        f"{p['page_title']}: output hit the max tokens limit and "
+                        "may be cut off (not cached)."
+                    )
+                result = _split_html_and_quiz(content, p["page_type"])
+                if _memoizable(result, p["page_type"]):
+                    _gpt_memo_put(payload, content, finish)
+                st.session_state.gpt_results[idx] = result
 
             st.session_state.visualized = True
             st.success("✅ Visualization complete. Previews below.")
 
+        # ----------------------------------------------------------------------
+        # Batch mode: poll + collect results of the last submitted batch
+        # ----------------------------------------------------------------------
+        # Session state does not survive a browser refresh, so a batch can be
+        # re-attached by ID (results map back via "page_<index>" custom_ids,
+        # so parse the same storyboard module first).
+        if st.session_state.get("gpt_batch_mode") and not st.session_state.get(
+            "gpt_batch"
+        ):
+            rb1, rb2 = st.columns([3, 1])
+            with rb1:
+                resume_id = st.text_input(
+                    "Resume a submitted batch", placeholder="batch_…"
+                ).strip()
+            with rb2:
+                st.write("")
+                if st.button("Resume batch", disabled=not resume_id):
+                    st.session_state.gpt_batch = {"id": resume_id, "indices": None}
+
+        batch_notice = st.session_state.pop("gpt_batch_notice", None)
+        if batch_notice:
+            st.success(batch_notice)
+
+        batch_info = st.session_state.get("gpt_batch")
+        if batch_info and st.button(
+            f"3️⃣b Check batch `{batch_info['id']}`", use_container_width=True
+        ):
+            client = _openai_client(os.getenv("OPENAI_API_KEY", ""))
+            try:
+                batch = retrieve_batch(client, batch_info["id"])
+            except Exception as e:
+                st.error(f"Could not retrieve batch: {e}")
+                st.stop()
+
+            counts = getattr(batch, "request_counts", None)
+            if batch.status not in TERMINAL_STATUSES:
+                st.info(
+                    f"Batch status: **{batch.status}**"
+                    + (
+                        f" · {counts.completed}/{counts.total} done"
+                        if counts is not None
+                        else ""
+                    )
+                )
+            else:
+                errors = batch_errors(batch)
+                if errors:
+                    st.error(
+                        f"Batch {batch.status}:\n"
+                        + "\n".join(f"- {err}" for err in errors)
+                    )
+                results = read_batch_output(client, batch)
+                if not results and errors:
+                    # Rejected as a whole (e.g. invalid JSONL): nothing to collect
+                    st.session_state.gpt_batch = None
+                    st.stop()
+                indices = batch_info["indices"]
+                if indices is None:  # resumed by ID: take whatever came back
+                    indices = sorted(
+                        int(cid.split("_", 1)[1])
+                        for cid in results
+                        if cid and cid.startswith("page_")
+                        and cid.split("_", 1)[1].isdigit()
+                    )
+                for idx in indices:
+                    if idx >= len(st.session_state.pages):
+                        continue
+                    r = results.get(f"page_{idx}")
+                    if not r:
+                        st.warning(f"No batch result for item {idx}.")
+                        continue
+                    if "error" in r:
+                        st.error(f"GPT error (item {idx}): {r['error']}")
+                        continue
+                    st.session_state.gpt_results[idx] = _split_html_and_quiz(
+                        r["content"], st.session_state.pages[idx]["page_type"]
+                    )
+                st.session_state.gpt_batch = None
+                st.session_state.visualized = True
+                if batch.status == "completed":
+                    st.success(
+                        "✅ Batch completed. Collected results are previewed below."
+                    )
+                else:
+                    st.warning(
+                        f"Batch {batch.status}. Collected results are previewed below."
+                    )
+
     # ──────────────────────────────────────────────────────────────────────────────
     # Preview & Upload — separate panels + upload all
     # ──────────────────────────────────────────────────────────────────────────────
@@ -1016,206 +1746,403 @@ def main():
         tabs = st.tabs(["Pages", "Assignments", "Discussions", "Quizzes"])
         type_map = {0: "page", 1: "assignment", 2: "discussion", 3: "quiz"}
 
+        # Bucket items by type once per rerun (each tab reads its own bucket)
+        pages_by_type = {t: [] for t in type_map.values()}
+        for p in st.session_state.pages:
+            pages_by_type.setdefault(p["page_type"], []).append(p)
+
         global_upload_btn_cols = st.columns([1, 3])
         with global_upload_btn_cols[0]:
             do_global_upload = st.button(
                 "🚀 Upload ALL Selected (across tabs)", type="secondary", disabled=False
             )
 
-        module_cache = {}
+        gpt_results = st.session_state.gpt_results
 
-        def _upload_item(p, html_result, quiz_json):
-            mid = get_or_create_module(
-                p["module_name"], canvas_domain, course_id, canvas_token, module_cache
-            )
-            if not mid:
-                st.error("Module creation failed.")
-                return False
+        # Content hash → created Canvas object, per course. A plain dict, so
+        # upload worker threads can read/write it without session_state.
+        uploaded_ids = st.session_state.uploaded_ids.setdefault(
+            f"{canvas_domain}|{course_id}", {}
+        )
 
-            if p["page_type"] == "page":
-                page_url = add_page(
+        # Set when the run is stopped mid-upload; _create_item() checks it
+        # before any Canvas call (worker threads can't see Streamlit state).
+        upload_stopped = threading.Event()
+
+        # Module name → id, kept across reruns per Canvas course so repeated
+        # uploads don't re-list or re-create the same modules. Refreshed by
+        # "Load Modules"; dropped (or the entry re-listed) when a module
+        # lookup or attach fails, so ids deleted in Canvas don't stick.
+        module_cache = st.session_state.module_cache_by_course.setdefault(
+            f"{canvas_domain}|{course_id}", {}
+        )
+
+        # Canvas object creation runs on worker threads for bulk uploads, so
+        # _create_item() must not touch Streamlit. Problems are collected as
+        # (level, message) tuples and rendered by the caller on the main thread.
+        def _simple_creator(add_fn, item_type):
+            """Handler for HTML-body items: one POST, no follow-up calls."""
+
+            def _create(p, html_result, quiz_json, result):
+                ref = add_fn(
                     canvas_domain, course_id, p["page_title"], html_result, canvas_token
                 )
-                return bool(
-                    page_url
-                    and add_to_module(
-                        canvas_domain,
-                        course_id,
-                        mid,
-                        "Page",
-                        page_url,
-                        p["page_title"],
-                        canvas_token,
-                    )
+                result.update(ok=bool(ref), item_type=item_type, item_ref=ref)
+                return result
+
+            return _create
+
+        def _create_quiz(p, html_result, quiz_json, result):
+            """Handler for quizzes: quiz shell + questions (New or Classic)."""
+            description = html_result
+            if (
+                quiz_json
+                and isinstance(quiz_json, dict)
+                and "quiz_description" in quiz_json
+            ):
+                description = quiz_json.get("quiz_description") or html_result
+
+            q_list = (
+                (quiz_json or {}).get("questions", [])
+                if isinstance(quiz_json, dict)
+                else []
+            )
+
+            use_classic = not use_new_quizzes or any(
+                q.get("question_type")
+                not in (
+                    "multiple_choice_question",
+                    "multiple_answers_question",
+                    "true_false_question",
                 )
+                for q in q_list
+            )
 
-            if p["page_type"] == "assignment":
-                aid = add_assignment(
-                    canvas_domain, course_id, p["page_title"], html_result, canvas_token
+            if use_classic:
+                # Classic quizzes (also the fallback when New Quizzes
+                # would receive unsupported question types)
+                qid = add_quiz(
+                    canvas_domain,
+                    course_id,
+                    p["page_title"],
+                    description,
+                    canvas_token,
                 )
-                return bool(
-                    aid
-                    and add_to_module(
-                        canvas_domain,
-                        course_id,
-                        mid,
-                        "Assignment",
-                        aid,
-                        p["page_title"],
-                        canvas_token,
-                    )
+                if qid:
+                    add_quiz_questions(canvas_domain, course_id, qid, q_list, canvas_token)
+                result.update(ok=bool(qid), item_type="Quiz", item_ref=qid)
+                return result
+
+            assignment_id, err, status, raw = add_new_quiz(
+                canvas_domain,
+                course_id,
+                p["page_title"],
+                description,
+                canvas_token,
+            )
+            if not assignment_id:
+                result["messages"].append(
+                    ("error", f"New Quiz (LTI) create failed [{status}]. {err}")
                 )
+                return result
 
-            if p["page_type"] == "discussion":
-                did = add_discussion(
-                    canvas_domain, course_id, p["page_title"], html_result, canvas_token
+            # Add ALL question types via dispatcher (concurrent, positioned)
+            item_results = add_items_for_questions(
+                canvas_domain, course_id, assignment_id, q_list, canvas_token
+            )
+            for pos, (q, (ok, dbg)) in enumerate(zip(q_list, item_results), start=1):
+                if not ok:
+                    result["messages"].append(
+                        (
+                            "warning",
+                            f"Failed to add item {pos} ({q.get('question_type')}): {dbg}",
+                        )
+                    )
+
+            result.update(ok=True, item_type="Assignment", item_ref=assignment_id)
+            result["attach_fail_msg"] = "Created New Quiz but failed to add it to the module."
+            return result
+
+        # page_type → creation handler (one place to wrap/extend per-type logic)
+        _CREATORS = {
+            "page": _simple_creator(add_page, "Page"),
+            "assignment": _simple_creator(add_assignment, "Assignment"),
+            "discussion": _simple_creator(add_discussion, "Discussion"),
+            "quiz": _create_quiz,
+        }
+
+        def _create_item(p, html_result, quiz_json):
+            """
+            Create the Canvas object for one item (no module attach).
+
+            Items already created in this session with identical content are
+            not created again; the stored Canvas reference is reused (and
+            the module attach skipped if that also succeeded before).
+
+            Returns:
+                dict: {"ok", "item_type", "item_ref", "messages"} where
+                item_type/item_ref are the add_to_module() arguments.
+            """
+            if upload_stopped.is_set():
+                # Run was stopped/rerun while this item was still queued
+                return {
+                    "ok": False,
+                    "item_type": None,
+                    "item_ref": None,
+                    "messages": [
+                        ("warning", "Upload stopped before this item started.")
+                    ],
+                }
+
+            key = _upload_key(p, html_result, quiz_json)
+            prior = uploaded_ids.get(key)
+            if prior:
+                return {
+                    "ok": True,
+                    "item_type": prior["item_type"],
+                    "item_ref": prior["item_ref"],
+                    "attached": prior["attached"],
+                    "upload_key": key,
+                    "messages": [
+                        ("info", "Already uploaded in this session — reused, not duplicated.")
+                    ],
+                }
+
+            result = {"ok": False, "item_type": None, "item_ref": None, "messages": []}
+            handler = _CREATORS.get(p["page_type"])
+            if handler is None:
+                return result
+            result = handler(p, html_result, quiz_json, result)
+            if result["ok"]:
+                result["upload_key"] = key
+                uploaded_ids[key] = {
+                    "item_type": result["item_type"],
+                    "item_ref": result["item_ref"],
+                    "attached": False,
+                }
+            return result
+
+        def _resolve_module(name):
+            """Module id for name; the course's module cache is dropped on failure."""
+            try:
+                mid = get_or_create_module(
+                    name, canvas_domain, course_id, canvas_token, module_cache
                 )
-                return bool(
-                    did
-                    and add_to_module(
+            except Exception:
+                module_cache.clear()
+                raise
+            if not mid:
+                module_cache.clear()
+            return mid
+
+        def _attach_item(p, mid, created):
+            """
+            Add a created item to its module (storyboard order per module).
+
+            If the attach fails, the cached module id may be stale (module
+            deleted in Canvas): the entry is dropped, the modules re-listed,
+            and the attach retried once if that yields a different id.
+
+            Returns:
+                tuple[bool, int]: (attached, module id to use for the next
+                item of the same module).
+            """
+            if not created["ok"]:
+                return False, mid
+            if created.get("attached"):
+                return True, mid
+
+            def _add(module_id):
+                # add_to_module() only absorbs HTTP error statuses; connection
+                # errors and timeouts must not abort the whole upload either.
+                try:
+                    return add_to_module(
                         canvas_domain,
                         course_id,
-                        mid,
-                        "Discussion",
-                        did,
+                        module_id,
+                        created["item_type"],
+                        created["item_ref"],
                         p["page_title"],
                         canvas_token,
                     )
-                )
-
-            if p["page_type"] == "quiz":
-                description = html_result
-                if (
-                    quiz_json
-                    and isinstance(quiz_json, dict)
-                    and "quiz_description" in quiz_json
-                ):
-                    description = quiz_json.get("quiz_description") or html_result
-
-                if use_new_quizzes:
-                    q_list = (
-                        (quiz_json or {}).get("questions", [])
-                        if isinstance(quiz_json, dict)
-                        else []
-                    )
-                    unsupported = [
-                        q
-                        for q in q_list
-                        if q.get("question_type")
-                        not in (
-                            "multiple_choice_question",
-                            "multiple_answers_question",
-                            "true_false_question",
-                        )
-                    ]
-                    if unsupported:
-                        # Fallback to classic if unsupported types present
-                        qid = add_quiz(
-                            canvas_domain,
-                            course_id,
-                            p["page_title"],
-                            description,
-                            canvas_token,
-                        )
-                        if qid:
-                            for q in q_list:
-                                add_quiz_question(
-                                    canvas_domain, course_id, qid, q, canvas_token
-                                )
-                            return add_to_module(
-                                canvas_domain,
-                                course_id,
-                                mid,
-                                "Quiz",
-                                qid,
-                                p["page_title"],
-                                canvas_token,
-                            )
-                        return False
-                    else:
-                        assignment_id, err, status, raw = add_new_quiz(
-                            canvas_domain,
-                            course_id,
-                            p["page_title"],
-                            description,
-                            canvas_token,
-                        )
-                        if not assignment_id:
-                            st.error(f"New Quiz (LTI) create failed [{status}]. {err}")
-                            return False
-
-                        # Add ALL question types via dispatcher
-                        q_list = (
-                            (quiz_json or {}).get("questions", [])
-                            if isinstance(quiz_json, dict)
-                            else []
-                        )
-                        for pos, q in enumerate(q_list, start=1):
-                            ok, dbg = add_item_for_question(
-                                canvas_domain,
-                                course_id,
-                                assignment_id,
-                                q,
-                                canvas_token,
-                                position=pos,
-                            )
-                            if not ok:
-                                st.warning(
-                                    f"Failed to add item {pos} ({q.get('question_type')}): {dbg}"
-                                )
-
-                        ok = add_to_module(
-                            canvas_domain,
-                            course_id,
-                            mid,
-                            "Assignment",
-                            assignment_id,
-                            p["page_title"],
-                            canvas_token,
-                        )
-                        if not ok:
-                            st.warning(
-                                "Created New Quiz but failed to add it to the module."
-                            )
-                        return ok
+                except Exception as e:
+                    created["messages"].append(("error", f"Module attach failed: {e}"))
+                    return False
 
-                else:  # classic quizzes path
-                    qid = add_quiz(
+            ok = _add(mid)
+            if not ok:
+                invalidate_module(module_cache, p["module_name"])
+                try:
+                    fresh = get_or_create_module(
+                        p["module_name"],
                         canvas_domain,
                         course_id,
-                        p["page_title"],
-                        description,
                         canvas_token,
+                        module_cache,
                     )
-                    if qid:
-                        q_list = (
-                            (quiz_json or {}).get("questions", [])
-                            if isinstance(quiz_json, dict)
-                            else []
+                except Exception:
+                    fresh = None
+                if fresh and fresh != mid:
+                    mid = fresh
+                    ok = _add(mid)
+            if ok and created.get("upload_key") in uploaded_ids:
+                uploaded_ids[created["upload_key"]]["attached"] = True
+            if not ok and created.get("attach_fail_msg"):
+                created["messages"].append(("warning", created["attach_fail_msg"]))
+            return ok, mid
+
+        def _show_messages(created):
+            for level, msg in created["messages"]:
+                {"error": st.error, "info": st.info}.get(level, st.warning)(msg)
+
+        def _prime_module_cache():
+            """One module listing per rerun; later lookups are dict hits."""
+            try:
+                prefetch_module_cache(
+                    canvas_domain, course_id, canvas_token, module_cache
+                )
+            except Exception:
+                # get_or_create_module() falls back to listing on its own
+                pass
+
+        def _upload_item(p, html_result, quiz_json):
+            _prime_module_cache()
+            mid = _resolve_module(p["module_name"])
+            if not mid:
+                st.error("Module creation failed.")
+                return False
+
+            created = _create_item(p, html_result, quiz_json)
+            ok, _ = _attach_item(p, mid, created)
+            _show_messages(created)
+            return ok
+
+        def _attach_module_items(mid, entries):
+            """
+            Attach one module's created items in storyboard order (worker
+            thread; no Streamlit). Returns [(p, created, ok), ...].
+            """
+            out = []
+            for p, created in entries:
+                ok, mid = _attach_item(p, mid, created)
+                out.append((p, created, ok))
+            return out
+
+        def _upload_many(pages_to_upload, max_workers=8):
+            """
+            Bulk upload in two phases:
+
+            1. Create every Canvas object concurrently (modules resolved first,
+               serially, on the main thread).
+            2. Attach to modules: items of the same module are attached one
+               after another in storyboard order (module positions follow the
+               document); different modules are attached concurrently.
+
+            Messages and toasts are rendered afterwards, on the main thread.
+            """
+            _prime_module_cache()
+            module_ids = {}
+            jobs = []
+            for p in pages_to_upload:
+                name = p["module_name"]
+                if name not in module_ids:
+                    module_ids[name] = _resolve_module(name)
+                if not module_ids[name]:
+                    st.error(f"Module creation failed: {name}")
+                    continue
+                res = gpt_results.get(p["index"]) or _EMPTY_RESULT
+                jobs.append((p, res["html"], res["quiz_json"]))
+
+            if not jobs:
+                return
+
+            outcomes = {}  # page index → (p, created, ok)
+            with st.spinner(f"Uploading {len(jobs)} item(s) to Canvas…"):
+                # Phase 1: create
+                pending_module_items = {}  # module id → [(p, created), ...]
+                pool = ThreadPoolExecutor(max_workers=min(max_workers, len(jobs)))
+                progress = st.progress(0.0, text=f"Created 0/{len(jobs)}")
+                try:
+                    futures = [pool.submit(_create_item, *job) for job in jobs]
+                    # Wait in short slices and touch the progress bar in between:
+                    # Streamlit only raises its stop/rerun exceptions from an
+                    # st.* call on this thread, so a blocking fut.result() here
+                    # could never be interrupted.
+                    not_done = set(futures)
+                    while not_done:
+                        _, not_done = wait(
+                            not_done, timeout=0.5, return_when=FIRST_COMPLETED
                         )
-                        for q in q_list:
-                            add_quiz_question(
-                                canvas_domain, course_id, qid, q, canvas_token
-                            )
-                        return add_to_module(
-                            canvas_domain,
-                            course_id,
-                            mid,
-                            "Quiz",
-                            qid,
-                            p["page_title"],
-                            canvas_token,
+                        n_done = len(futures) - len(not_done)
+                        progress.progress(
+                            n_done / len(futures), text=f"Created {n_done}/{len(jobs)}"
                         )
-                    return False
-
-            return False
+                    for (p, _html, _quiz), fut in zip(jobs, futures):
+                        try:
+                            created = fut.result()
+                        except Exception as e:
+                            # Aggregate per-item failures; peers keep going
+                            created = {"ok": False, "messages": [("error", str(e))]}
+                            outcomes[p["index"]] = (p, created, False)
+                            continue
+                        mid = module_ids[p["module_name"]]
+                        pending_module_items.setdefault(mid, []).append((p, created))
+                except BaseException:
+                    # Script stopped/rerun: drop queued items, and make any
+                    # that slip through return before their first POST
+                    upload_stopped.set()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+                pool.shutdown(wait=True)
+                progress.empty()
+
+                # Phase 2: attach (sequential per module, parallel across modules)
+                if pending_module_items:
+                    with ThreadPoolExecutor(
+                        max_workers=min(max_workers, len(pending_module_items))
+                    ) as pool:
+                        attached = [
+                            (entries, pool.submit(_attach_module_items, mid, entries))
+                            for mid, entries in pending_module_items.items()
+                        ]
+                        for entries, fut in attached:
+                            try:
+                                results = fut.result()
+                            except Exception as e:
+                                # Items were created; report the failed attach
+                                results = []
+                                for p, created in entries:
+                                    created["messages"].append(
+                                        ("error", f"Module attach failed: {e}")
+                                    )
+                                    results.append((p, created, False))
+                            for p, created, ok in results:
+                                outcomes[p["index"]] = (p, created, ok)
+
+            # Single status block instead of one toast/alert per item
+            n_ok = sum(1 for _, _, ok in outcomes.values() if ok)
+            lines = []
+            for p, _html, _quiz in jobs:
+                if p["index"] not in outcomes:
+                    continue
+                _, created, ok = outcomes[p["index"]]
+                mark = "✅" if ok else "❌"
+                lines.append(f"- {mark} **{p['page_title']}** ({p['page_type']})")
+                for level, msg in created["messages"]:
+                    icon = {"error": "⛔", "info": "ℹ️"}.get(level, "⚠️")
+                    lines.append(f"    - {icon} {msg}")
+
+            with st.status(
+                f"Uploaded {n_ok}/{len(jobs)} item(s)",
+                state="complete" if n_ok == len(jobs) else "error",
+                expanded=n_ok != len(jobs),
+            ):
+                st.markdown("\n".join(lines))
 
         for tab_idx, tab in enumerate(tabs):
             target_type = type_map[tab_idx]
             with tab:
-                items = [
-                    p for p in st.session_state.pages if p["page_type"] == target_type
-                ]
+                items = pages_by_type[target_type]
                 tcols = st.columns([1, 1, 2])
                 with tcols[0]:
                     if st.button(f"Select all in {target_type.title()}s"):
@@ -1242,12 +2169,8 @@ def main():
                     idx = p["index"]
                     meta = f"{p['page_title']}  · Module: {p['module_name']}"
                     with st.expander(meta, expanded=False):
-                        html_result = st.session_state.gpt_results.get(idx, {}).get(
-                            "html", ""
-                        )
-                        quiz_json = st.session_state.gpt_results.get(idx, {}).get(
-                            "quiz_json"
-                        )
+                        res = gpt_results.get(idx) or _EMPTY_RESULT
+                        html_result, quiz_json = res["html"], res["quiz_json"]
                         st.code(html_result or "[No HTML returned]", language="html")
                         if p["page_type"] == "quiz" and quiz_json:
                             st.json(quiz_json)
@@ -1279,50 +2202,29 @@ def main():
                             )
 
                 if do_tab_upload and not dry_run:
-                    for p in items:
-                        idx = p["index"]
-                        if idx in st.session_state.upload_selected:
-                            html_result = st.session_state.gpt_results.get(idx, {}).get(
-                                "html", ""
-                            )
-                            quiz_json = st.session_state.gpt_results.get(idx, {}).get(
-                                "quiz_json"
-                            )
-                            if _upload_item(p, html_result, quiz_json):
-                                st.toast(f"Uploaded: {p['page_title']}", icon="✅")
+                    _upload_many(
+                        [
+                            p
+                            for p in items
+                            if p["index"] in st.session_state.upload_selected
+                        ]
+                    )
 
         # Global upload
         if do_global_upload and not dry_run:
-            for p in st.session_state.pages:
-                idx = p["index"]
-                if idx in st.session_state.upload_selected:
-                    html_result = st.session_state.gpt_results.get(idx, {}).get(
-                        "html", ""
-                    )
-                    quiz_json = st.session_state.gpt_results.get(idx, {}).get(
-                        "quiz_json"
-                    )
-                    if _upload_item(p, html_result, quiz_json):
-                        st.toast(f"Uploaded: {p['page_title']}", icon="✅")
-
-    # Helpful hints
-    if not st.session_state.get("selected_tag_module_text"):
-        st.info(
-            "Scan for `<module_name>…</module>` tags and pick a module, then click **Parse storyboard**.",
-            icon="📝",
-        )
-    elif (
-        st.session_state.get("selected_tag_module_text") and not st.session_state.pages
-    ):
-        st.warning(
-            "Click **Parse storyboard** to extract the items in the chosen module.",
-            icon="👉",
-        )
-    elif st.session_state.pages and not st.session_state.visualized:
-        st.info(
-            "Review & adjust metadata above (and pick course templates if desired), then click **Visualize selected**.",
-            icon="🔎",
-        )
+            _upload_many(
+                [
+                    p
+                    for p in st.session_state.pages
+                    if p["index"] in st.session_state.upload_selected
+                ]
+            )
+
+    # Helpful hints (one state classification, one hint)
+    hint = _GUIDANCE.get(_classify_ui_state(st.session_state))
+    if hint:
+        kind, text, icon = hint
+        (st.warning if kind == "warning" else st.info)(text, icon=icon)
 
 
 if __name__ == "__main__":
@@ -13,8 +13,11 @@
 #         - Retrieving and posting classic quizzes
 #         - Fetching item bodies (HTML content)
 #
-#     These helpers are intentionally minimal and synchronous. The app-level code
-#     decides how to handle retries, UI display, and GPT transformations.
+#     All HTTP goes through canvas_http, which owns the pooled session,
+#     throttle retries with backoff, per-host in-flight caps and rate-limit
+#     pacing. Helpers here add ETag-conditional GETs, parallel page fetches
+#     and the module-name cache. The app-level code decides UI display and
+#     GPT transformations.
 #
 # Behaviour guarantees:
 #     - No changes to existing logic
@@ -22,54 +25,147 @@
 #     - Errors raised via requests.exceptions.HTTPError unless explicitly caught
 # ------------------------------------------------------------------------------
 
-import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from typing import Dict, List, Optional, Any, Tuple
 
+import canvas_http  # pooled keep-alive session shared by all Canvas helpers
+
 
 # ==============================================================================
 # Internal helpers
 # ==============================================================================
 
 
-def _headers(token: str) -> Dict[str, str]:
+# URL + auth-header builders live in canvas_http (one copy for every module).
+_headers = canvas_http.auth_headers
+_url = canvas_http.api_url
+
+
+# (url, token) → (etag, parsed page, next url, last url) for conditional
+# re-fetches.
+_ETAG_CACHE: Dict[
+    Tuple[str, str], Tuple[str, List[Dict], Optional[str], Optional[str]]
+] = {}
+_ETAG_CACHE_MAX = 256
+_ETAG_LOCK = threading.Lock()
+
+# Upper bound on concurrent page GETs for one listing (canvas_http still caps
+# in-flight requests per host).
+PAGE_FETCH_WORKERS = 4
+
+
+def _get_page(
+    url: str, token: str
+) -> Tuple[List[Dict], Optional[str], Optional[str]]:
     """
-    Construct the required Canvas API headers.
+    GET one page of a Canvas list endpoint, revalidating with If-None-Match.
 
-    Parameters:
-        token (str): Canvas API token.
+    When Canvas answers 304 Not Modified the previously parsed page (and its
+    Link urls) is reused, so unchanged listings cost no body transfer or
+    JSON parsing.
 
     Returns:
-        Dict[str, str]: Authorization header.
+        Tuple:
+            - List[Dict]: The page's JSON array
+            - Optional[str]: URL of the next page, if any
+            - Optional[str]: URL of the last page, if Canvas sent one
     """
-    return {"Authorization": f"Bearer {token}"}
+    headers = _headers(token)
+    cached = _ETAG_CACHE.get((url, token))
+    if cached:
+        headers["If-None-Match"] = cached[0]
+
+    r = canvas_http.get(url, headers=headers)
+    if r.status_code == 304 and cached:
+        return cached[1], cached[2], cached[3]
+    r.raise_for_status()
 
+    data = canvas_http.response_json(r)
+    next_url = r.links.get("next", {}).get("url")
+    last_url = r.links.get("last", {}).get("url")
+    etag = r.headers.get("ETag")
+    if etag:
+        with _ETAG_LOCK:
+            if len(_ETAG_CACHE) >= _ETAG_CACHE_MAX:
+                _ETAG_CACHE.pop(next(iter(_ETAG_CACHE)), None)
+            _ETAG_CACHE[(url, token)] = (etag, data, next_url, last_url)
+    return data, next_url, last_url
 
-def _url(base: str, path: str) -> str:
+
+def _numbered_page_urls(next_url: Optional[str], last_url: Optional[str]) -> List[str]:
     """
-    Build a full Canvas API URL from a base domain and a REST path.
+    Expand rel="next" … rel="last" into every page URL in between.
 
-    Notes:
-        - If the user enters `canvas.myuni.edu`, we prepend https://
-        - If the user already enters https://... we leave it as-is.
+    Only possible when both links carry a plain numeric page= parameter
+    (Canvas sends opaque "bookmark:" pages for some endpoints, and omits
+    rel="last" when counting would be expensive). Returns [] otherwise, so
+    callers fall back to following rel="next".
+    """
+    if not next_url or not last_url:
+        return []
+    nxt, last = urlsplit(next_url), urlsplit(last_url)
+    nxt_q, last_q = parse_qsl(nxt.query), dict(parse_qsl(last.query))
+    first = dict(nxt_q).get("page", "")
+    final = last_q.get("page", "")
+    if not (first.isdigit() and final.isdigit()) or int(final) < int(first):
+        return []
+
+    urls = []
+    for n in range(int(first), int(final) + 1):
+        query = urlencode([(k, str(n) if k == "page" else v) for k, v in nxt_q])
+        urls.append(urlunsplit(nxt._replace(query=query)))
+    return urls
+
+
+def _get_all_pages(url: str, token: str) -> List[Dict]:
+    """
+    GET a Canvas list endpoint and collect every page of its pagination.
+
+    Behaviour:
+        - The first page is fetched on its own; if its Link header exposes a
+          numbered rel="last", the remaining pages are fetched concurrently
+          (PAGE_FETCH_WORKERS) and concatenated in page order.
+        - Otherwise rel="next" links are followed one at a time.
 
-    Example:
-        _url("canvas.myuni.edu", "/api/v1/courses/123/pages")
-        → "https://canvas.myuni.edu/api/v1/courses/123/pages"
+    Returns:
+        List[Dict]: Concatenated JSON arrays from every page.
     """
-    base = base.rstrip("/")
-    if base.startswith("http"):
-        return f"{base}{path}"
-    return f"https://{base}{path}"
+    data, url, last_url = _get_page(url, token)
+    out: List[Dict] = list(data)
+
+    page_urls = _numbered_page_urls(url, last_url)
+    if page_urls:
+        workers = min(PAGE_FETCH_WORKERS, len(page_urls))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for page in pool.map(lambda u: _get_page(u, token)[0], page_urls):
+                out.extend(page)
+        return out
+
+    while url:
+        data, url, _ = _get_page(url, token)
+        out.extend(data)
+    return out
 
 
 # ==============================================================================
 # Modules & Module Items
 # ==============================================================================
 
+# Marker stored in a module cache once it holds the course's full module list,
+# so misses can go straight to creation without re-listing.
+_MODULE_CACHE_PRIMED = "\x00primed"
+
+
+def _module_key(name: str) -> str:
+    """Normalise a module name for cache lookups (case/whitespace-insensitive)."""
+    return (name or "").strip().lower()
+
 
 def list_modules(base: str, course_id: str, token: str) -> List[Dict]:
     """
-    Retrieve all modules for a Canvas course.
+    Retrieve all modules for a Canvas course (all pages, 100 per request).
 
     Returns:
         List[Dict]: Each module dictionary contains fields such as:
@@ -79,10 +175,55 @@ def list_modules(base: str, course_id: str, token: str) -> List[Dict]:
             - unlock_at
             - require_sequential_progress (if enabled)
     """
-    url = _url(base, f"/api/v1/courses/{course_id}/modules")
-    r = requests.get(url, headers=_headers(token))
-    r.raise_for_status()
-    return r.json()
+    url = _url(base, f"/api/v1/courses/{course_id}/modules?per_page=100")
+    return _get_all_pages(url, token)
+
+
+def prefetch_module_cache(
+    base: str,
+    course_id: str,
+    token: str,
+    cache: Dict[str, int],
+    modules: Optional[List[Dict]] = None,
+) -> Dict[str, int]:
+    """
+    Fill a get_or_create_module() cache with every existing module in one listing.
+
+    Call once before a bulk upload: subsequent get_or_create_module() calls
+    are pure dict lookups, and only genuinely new modules cost a POST.
+
+    Parameters:
+        modules (Optional[List[Dict]]): A full list_modules() result the
+            caller already holds; when given, no listing request is made.
+
+    Returns:
+        Dict[str, int]: The same cache (normalised name → module id).
+
+    Behaviour:
+        - Already primed and no modules given → no request, cache unchanged.
+        - Otherwise the cache is *replaced* by the listing, so ids of modules
+          deleted or renamed in Canvas do not survive a refresh.
+    """
+    if cache.get(_MODULE_CACHE_PRIMED) and modules is None:
+        return cache
+    if modules is None:
+        modules = list_modules(base, course_id, token)
+    fresh = {_module_key(m["name"]): m["id"] for m in modules}
+    cache.clear()
+    cache.update(fresh)
+    cache[_MODULE_CACHE_PRIMED] = True
+    return cache
+
+
+def invalidate_module(cache: Dict[str, int], name: str) -> None:
+    """
+    Forget a cached module id (e.g. the module was deleted in Canvas).
+
+    Also drops the primed marker, so the next get_or_create_module() call
+    for that name re-lists the course's modules before creating one.
+    """
+    cache.pop(_module_key(name), None)
+    cache.pop(_MODULE_CACHE_PRIMED, None)
 
 
 def list_module_items(
@@ -92,7 +233,9 @@ def list_module_items(
     List all items inside a Canvas module.
 
     Notes:
-        - Canvas defaults to pagination; ?per_page=100 ensures larger modules load fully.
+        - Requests 100 items per page (Canvas's maximum) and follows Link
+          rel="next" only when Canvas returns one, so most modules load in a
+          single request.
 
     Returns:
         List[Dict]: Items with fields like:
@@ -105,9 +248,7 @@ def list_module_items(
     url = _url(
         base, f"/api/v1/courses/{course_id}/modules/{module_id}/items?per_page=100"
     )
-    r = requests.get(url, headers=_headers(token))
-    r.raise_for_status()
-    return r.json()
+    return _get_all_pages(url, token)
 
 
 def get_or_create_module(
@@ -122,30 +263,34 @@ def get_or_create_module(
 
     Parameters:
         name (str): Module name (case-insensitive match).
-        cache (dict): Local module-name → id cache.
+        cache (dict): Local normalised-module-name → id cache (see
+            prefetch_module_cache()).
 
     Returns:
         Optional[int]: Module ID if found/created, else None.
     """
+    key = _module_key(name)
+
     # Cached?
-    if name in cache:
-        return cache[name]
+    if key in cache:
+        return cache[key]
 
-    # Try match existing modules
-    for m in list_modules(base, course_id, token):
-        if m["name"].strip().lower() == name.strip().lower():
-            cache[name] = m["id"]
-            return m["id"]
+    # Try match existing modules (skipped when the cache holds the full list)
+    if not cache.get(_MODULE_CACHE_PRIMED):
+        for m in list_modules(base, course_id, token):
+            if _module_key(m["name"]) == key:
+                cache[key] = m["id"]
+                return m["id"]
 
     # Create new
     url = _url(base, f"/api/v1/courses/{course_id}/modules")
     payload = {"module": {"name": name}}
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
     r.raise_for_status()
 
-    mid = r.json().get("id")
+    mid = canvas_http.response_json(r).get("id")
     if mid:
-        cache[name] = mid
+        cache[key] = mid
     return mid
 
 
@@ -176,9 +321,9 @@ def add_page(
             "published": True,
         }
     }
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
     r.raise_for_status()
-    return r.json().get("url")
+    return canvas_http.response_json(r).get("url")
 
 
 def get_page_body(
@@ -193,10 +338,10 @@ def get_page_body(
             - Full Canvas page dictionary
     """
     url = _url(base, f"/api/v1/courses/{course_id}/pages/{page_url}")
-    r = requests.get(url, headers=_headers(token))
+    r = canvas_http.get(url, headers=_headers(token))
     r.raise_for_status()
 
-    data = r.json()
+    data = canvas_http.response_json(r)
     return data.get("body") or "", data
 
 
@@ -227,9 +372,9 @@ def add_assignment(
             "description": description_html,
         }
     }
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
     r.raise_for_status()
-    return r.json().get("id")
+    return canvas_http.response_json(r).get("id")
 
 
 def get_assignment_description(
@@ -244,10 +389,10 @@ def get_assignment_description(
             - full assignment JSON
     """
     url = _url(base, f"/api/v1/courses/{course_id}/assignments/{assignment_id}")
-    r = requests.get(url, headers=_headers(token))
+    r = canvas_http.get(url, headers=_headers(token))
     r.raise_for_status()
 
-    data = r.json()
+    data = canvas_http.response_json(r)
     return data.get("description") or "", data
 
 
@@ -271,9 +416,9 @@ def add_discussion(
     """
     url = _url(base, f"/api/v1/courses/{course_id}/discussion_topics")
     payload = {"title": title, "message": message_html, "published": True}
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
     r.raise_for_status()
-    return r.json().get("id")
+    return canvas_http.response_json(r).get("id")
 
 
 def get_discussion_body(base: str, course_id: str, discussion_id: int, token: str):
@@ -286,10 +431,10 @@ def get_discussion_body(base: str, course_id: str, discussion_id: int, token: st
             - full discussion JSON
     """
     url = _url(base, f"/api/v1/courses/{course_id}/discussion_topics/{discussion_id}")
-    r = requests.get(url, headers=_headers(token))
+    r = canvas_http.get(url, headers=_headers(token))
     r.raise_for_status()
 
-    data = r.json()
+    data = canvas_http.response_json(r)
     return data.get("message") or "", data
 
 
@@ -331,7 +476,7 @@ def add_to_module(
     else:
         item["content_id"] = content_id_or_url
 
-    r = requests.post(url, headers=_headers(token), json={"module_item": item})
+    r = canvas_http.post(url, headers=_headers(token), json={"module_item": item})
     try:
         r.raise_for_status()
         return True
@@ -349,8 +494,8 @@ def get_quiz_description(base: str, course_id: str, quiz_id: int, token: str):
             - full quiz JSON
     """
     url = _url(base, f"/api/v1/courses/{course_id}/quizzes/{quiz_id}")
-    r = requests.get(url, headers=_headers(token))
+    r = canvas_http.get(url, headers=_headers(token))
     r.raise_for_status()
 
-    data = r.json()
+    data = canvas_http.response_json(r)
     return data.get("description") or "", data
@@ -0,0 +1,410 @@
+# ------------------------------------------------------------------------------
+# File: canvas_http.py
+#
+# Purpose:
+#     Shared HTTP transport for every Canvas helper module (canvas_api.py,
+#     quizzes_classic.py, quizzes_new.py).
+#
+# Why:
+#     - Module-level requests.get/post open a fresh TCP + TLS connection per
+#       call. A single pooled Session keeps connections to the Canvas host
+#       alive, so bulk uploads only pay the handshake once per connection.
+#     - The pool is sized for the concurrent upload workers used by the app.
+#
+# Behaviour:
+#     - `get()` / `post()` mirror requests.get / requests.post and return the
+#       raw Response — callers keep their existing status handling.
+#     - Throttled responses are retried with exponential backoff + jitter,
+#       honouring Retry-After (see _is_retryable for the classification).
+#       POSTs are only retried when Canvas signals the request was rejected
+#       (429 / 403 "rate limit" / 503), never on ambiguous 500/502/504 — a
+#       replayed POST could duplicate a page or question.
+#     - In-flight requests are capped per Canvas host (MAX_IN_FLIGHT_PER_HOST),
+#       so nested thread pools (items × quiz questions) cannot stampede the
+#       Canvas rate limiter.
+#     - Optional gzip request bodies (CANVAS_GZIP_REQUESTS=1) for large JSON
+#       POSTs; hosts that reject them (400/415) fall back to plain JSON and are
+#       remembered for the rest of the process.
+#     - response_json() decodes response bodies with orjson when available.
+#     - api_url() / auth_headers() are the single URL + auth-header builders
+#       for all Canvas helper modules.
+#     - CanvasRateLimiter tracks Canvas's X-Rate-Limit-Remaining header per
+#       (host, token) and slows callers down *before* the bucket runs dry,
+#       instead of hitting 403/429 and backing off afterwards.
+#
+# Notes:
+#     - requests.Session is safe to share across the app's worker threads for
+#       plain request/response use (no per-thread cookies or auth state).
+#     - This module is purely backend logic. No Streamlit, no UI.
+# ------------------------------------------------------------------------------
+
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # optional fast JSON encoder
+    import orjson
+except Exception:  # falls back to stdlib json
+    orjson = None
+
+
+# ==============================================================================
+# Pooled Session
+# ==============================================================================
+
+POOL_CONNECTIONS = 20
+POOL_MAXSIZE = 20
+
+
+def _build_session() -> requests.Session:
+    """
+    Construct the shared Session with a keep-alive connection pool.
+
+    Returns:
+        requests.Session: Session with HTTPAdapters mounted for http/https.
+    """
+    # Status-based retries are handled by _request(); urllib3 only retries
+    # transport-level failures for idempotent methods.
+    retry = Retry(
+        total=3, backoff_factor=0.5, status_forcelist=(), raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_SESSION = _build_session()
+
+
+# ==============================================================================
+# Per-host concurrency cap
+# ==============================================================================
+
+MAX_IN_FLIGHT_PER_HOST = 10
+
+_HOST_SEMAPHORES = {}
+_HOST_SEMAPHORES_LOCK = threading.Lock()
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    """
+    Return (and lazily create) the semaphore guarding requests to url's host.
+    """
+    host = urlsplit(url).netloc.lower()
+    sem = _HOST_SEMAPHORES.get(host)
+    if sem is None:
+        with _HOST_SEMAPHORES_LOCK:
+            sem = _HOST_SEMAPHORES.setdefault(
+                host, threading.BoundedSemaphore(MAX_IN_FLIGHT_PER_HOST)
+            )
+    return sem
+
+
+# ==============================================================================
+# Header-driven rate limiter
+# ==============================================================================
+
+
+class CanvasRateLimiter:
+    """
+    Adaptive pacing from Canvas's leaky-bucket headers.
+
+    Canvas reports the caller's remaining quota in X-Rate-Limit-Remaining
+    (and the cost of the request just made in X-Request-Cost). While the
+    remaining quota is above LOW_WATER requests go straight through; below
+    it, callers sleep long enough for the bucket to refill the deficit.
+    """
+
+    LOW_WATER = 100.0
+    # Approximate bucket refill rate (units / second); Canvas does not
+    # publish it per instance, so this errs on the slow side.
+    REFILL_PER_SEC = 10.0
+    MAX_WAIT = 10.0  # seconds
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.remaining: Optional[float] = None
+        self.cost: Optional[float] = None
+
+    def acquire(self) -> None:
+        """Block while the observed quota sits below LOW_WATER."""
+        with self._lock:
+            remaining = self.remaining
+            if remaining is None or remaining >= self.LOW_WATER:
+                return
+            deficit = self.LOW_WATER - remaining
+            wait = min(self.MAX_WAIT, deficit / self.REFILL_PER_SEC)
+            # Assume the refill happens while we wait, so concurrent callers
+            # don't all sleep for the same deficit.
+            self.remaining = remaining + wait * self.REFILL_PER_SEC
+        time.sleep(wait)
+
+    def update(self, r: requests.Response) -> None:
+        """Record the quota headers of a Canvas response (if present)."""
+        remaining = r.headers.get("X-Rate-Limit-Remaining")
+        cost = r.headers.get("X-Request-Cost")
+        with self._lock:
+            try:
+                if remaining is not None:
+                    self.remaining = float(remaining)
+                if cost is not None:
+                    self.cost = float(cost)
+            except ValueError:
+                pass
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def _rate_limiter(url: str, headers: Optional[dict]) -> CanvasRateLimiter:
+    """
+    Return the limiter for url's host and the caller's token.
+
+    Canvas quotas are per user token, so two tokens on one host get
+    separate buckets.
+    """
+    auth = (headers or {}).get("Authorization", "")
+    key = (urlsplit(url).netloc.lower(), auth)
+    limiter = _LIMITERS.get(key)
+    if limiter is None:
+        with _LIMITERS_LOCK:
+            limiter = _LIMITERS.setdefault(key, CanvasRateLimiter())
+    return limiter
+
+
+# ==============================================================================
+# Throttle-aware retry
+# ==============================================================================
+
+# (connect, read) seconds applied when a caller passes no timeout, so one
+# stuck Canvas request cannot wedge an upload worker indefinitely.
+DEFAULT_TIMEOUT = (10, 60)
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 16.0  # seconds
+
+# Canvas rejected the request outright (safe to replay any method).
+_THROTTLE_STATUSES = (429, 503)
+# Transient gateway/server errors: only replayed for idempotent methods.
+_TRANSIENT_STATUSES = (500, 502, 504)
+_THROTTLE_MARKERS = ("rate limit", "quota", "throttl")
+
+
+def _is_retryable(method: str, r: requests.Response) -> bool:
+    """
+    Classify a response as worth retrying.
+
+    Canvas signals throttling with 429, or with 403 + "Rate Limit Exceeded"
+    in the body; 503 means the request was not processed.
+    """
+    if r.status_code in _THROTTLE_STATUSES:
+        return True
+    if r.status_code == 403:
+        body = (r.text or "")[:500].lower()
+        return any(marker in body for marker in _THROTTLE_MARKERS)
+    return method == "GET" and r.status_code in _TRANSIENT_STATUSES
+
+
+def _retry_delay(r: requests.Response, attempt: int) -> float:
+    """Retry-After if Canvas sent one, else capped exponential backoff + jitter."""
+    retry_after: Optional[str] = r.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt) + random.uniform(0, 0.25)
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Send one request through the shared session, retrying throttled responses.
+
+    The per-host slot is released while sleeping, so a backing-off worker
+    does not block others from using the connection budget.
+    """
+    kwargs = _encode_json_kwargs(kwargs)
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    limiter = _rate_limiter(url, kwargs.get("headers"))
+    for attempt in range(MAX_ATTEMPTS):
+        limiter.acquire()
+        with _host_semaphore(url):
+            r = _SESSION.request(method, url, **kwargs)
+        limiter.update(r)
+        if attempt == MAX_ATTEMPTS - 1 or not _is_retryable(method, r):
+            return r
+        time.sleep(_retry_delay(r, attempt))
+    return r
+
+
+# ==============================================================================
+# JSON encoding / decoding
+# ==============================================================================
+
+
+def _dumps(payload) -> bytes:
+    """
+    Serialise a request payload to UTF-8 JSON bytes.
+
+    Uses orjson when installed (several times faster on large HTML/quiz
+    payloads and produces bytes directly); falls back to stdlib json for
+    anything orjson refuses.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(payload).encode("utf-8")
+
+
+def response_json(r: requests.Response):
+    """
+    Parse a Canvas response body as JSON.
+
+    orjson parses the raw bytes directly (no text decode step); falls back
+    to Response.json() when orjson is unavailable. Raises ValueError on an
+    invalid body, like Response.json().
+    """
+    if orjson is not None:
+        return orjson.loads(r.content)
+    return r.json()
+
+
+def _encode_json_kwargs(kwargs: dict) -> dict:
+    """Replace a json= kwarg with a pre-encoded data= body + Content-Type."""
+    if kwargs.get("json") is None:
+        return kwargs
+    out = {k: v for k, v in kwargs.items() if k != "json"}
+    headers = dict(out.get("headers") or {})
+    headers.setdefault("Content-Type", "application/json")
+    out["headers"] = headers
+    out["data"] = _dumps(kwargs["json"])
+    return out
+
+
+# ==============================================================================
+# Request-body compression (opt-in)
+# ==============================================================================
+
+# Off by default: not every Canvas deployment decodes Content-Encoding on
+# requests. Enable per deployment once verified.
+GZIP_REQUESTS = os.getenv("CANVAS_GZIP_REQUESTS", "").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+GZIP_MIN_BYTES = 16 * 1024
+
+_GZIP_UNSUPPORTED_HOSTS = set()
+
+
+def _gzip_kwargs(url: str, kwargs: dict) -> Optional[dict]:
+    """
+    Return request kwargs with the json= body gzip-encoded, or None when
+    compression is disabled, unsupported by the host, or not worthwhile.
+    """
+    if not GZIP_REQUESTS or kwargs.get("json") is None:
+        return None
+    if urlsplit(url).netloc.lower() in _GZIP_UNSUPPORTED_HOSTS:
+        return None
+
+    out = _encode_json_kwargs(kwargs)
+    if len(out["data"]) < GZIP_MIN_BYTES:
+        return None
+
+    out["headers"]["Content-Encoding"] = "gzip"
+    out["data"] = gzip.compress(out["data"], compresslevel=6)
+    return out
+
+
+def _gzip_rejected(r: requests.Response) -> bool:
+    """
+    True if a gzip-encoded request failed because of its Content-Encoding.
+
+    415 always counts; a 400 only when its body mentions the encoding, so
+    ordinary validation errors are returned as-is instead of being resent
+    (and gzip disabled for the host).
+    """
+    if r.status_code == 415:
+        return True
+    if r.status_code != 400:
+        return False
+    body = (r.text or "")[:2048].lower()
+    return any(word in body for word in ("encoding", "gzip", "compress"))
+
+
+# ==============================================================================
+# URL / header helpers (shared by canvas_api, quizzes_classic, quizzes_new)
+# ==============================================================================
+
+
+def auth_headers(token: str) -> dict:
+    """
+    Return Canvas-compatible Authorization headers.
+
+    Parameters:
+        token (str): Canvas API token.
+
+    Returns:
+        dict: {'Authorization': 'Bearer <token>'}
+    """
+    return {"Authorization": f"Bearer {token}"}
+
+
+def api_url(base: str, path: str) -> str:
+    """
+    Build a fully qualified Canvas URL from a base domain and a REST path.
+
+    Behaviour:
+        - Accepts both "canvas.myuni.edu" and "https://canvas.myuni.edu";
+          https:// is prepended only when no scheme is given.
+        - Strips trailing slashes from base so paths never double up.
+
+    Example:
+        api_url("canvas.myuni.edu", "/api/v1/courses/123/pages")
+        → "https://canvas.myuni.edu/api/v1/courses/123/pages"
+    """
+    base = base.rstrip("/")
+    if base.startswith("http"):
+        return f"{base}{path}"
+    return f"https://{base}{path}"
+
+
+# ==============================================================================
+# Public API
+# ==============================================================================
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared Canvas session (same signature as requests.get)."""
+    return _request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST through the shared Canvas session (same signature as requests.post)."""
+    gz = _gzip_kwargs(url, kwargs)
+    if gz is not None:
+        r = _request("POST", url, **gz)
+        if not _gzip_rejected(r):
+            return r
+        # Host rejected the encoded body: remember and resend as plain JSON.
+        _GZIP_UNSUPPORTED_HOSTS.add(urlsplit(url).netloc.lower())
+    return _request("POST", url, **kwargs)
@@ -42,23 +42,47 @@
 import io
 import re
 import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
 from typing import List, Dict, Optional, Tuple
 
 
+# ==============================================================================
+# URL Patterns
+# ==============================================================================
+
+# https://docs.google.com/document/d/<FILEID>/...
+_DOC_ID_RE = re.compile(r"/document/d/([a-zA-Z0-9_-]+)")
+
+# ?tab=h.<frag> / ?tab=t.<frag> (also after # or &)
+_TAB_ANCHOR_RE = re.compile(r"[?#&]tab=([ht])\.([A-Za-z0-9_-]+)")
+
+
 # ==============================================================================
 # Internal Google Client Builders (Lazy Loaded)
 # ==============================================================================
 
 
-def _ensure_docs(sa_json_bytes: bytes):
-    """
-    Lazily instantiate a Google Docs API client using a Service Account.
+_DOCS_SCOPES = (
+    "https://www.googleapis.com/auth/drive.readonly",
+    "https://www.googleapis.com/auth/documents.readonly",
+)
+_DRIVE_SCOPES = ("https://www.googleapis.com/auth/drive.readonly",)
 
-    Parameters:
-        sa_json_bytes (bytes): Raw JSON of a Google Service Account.
+# Service objects wrap an httplib2.Http, which is not thread-safe, so built
+# clients live in a process-wide idle pool keyed on (api, version, SA bytes):
+# a caller checks one out, uses it alone, and returns it. The pool survives
+# Streamlit reruns (each rerun runs on a fresh thread). Credentials are
+# shared process-wide.
+_SERVICE_POOL: Dict[Tuple[str, str, bytes], List] = {}
+_SERVICE_POOL_LOCK = threading.Lock()
 
-    Returns:
-        googleapiclient.discovery.Resource: Docs API client.
+
+def _google_imports():
+    """
+    Import the Google client libraries lazily.
 
     Raises:
         RuntimeError: Missing dependencies (google-api-python-client / google-auth).
@@ -71,43 +95,90 @@ def _ensure_docs(sa_json_bytes: bytes):
             "Google API client libraries are missing. "
             "Add 'google-api-python-client' and 'google-auth' to requirements.txt."
         ) from e
+    return build, service_account
+
+
+@lru_cache(maxsize=8)
+def _credentials(sa_json_bytes: bytes, scopes: Tuple[str, ...]):
+    """
+    Parse a Service Account JSON into scoped credentials (cached per key + scopes).
 
-    creds = service_account.Credentials.from_service_account_info(
+    Avoids re-parsing JSON and re-loading the RSA private key on every call;
+    google-auth refreshes the access token on the shared object as needed.
+    """
+    _, service_account = _google_imports()
+    return service_account.Credentials.from_service_account_info(
         json.loads(sa_json_bytes.decode("utf-8")),
-        scopes=[
-            "https://www.googleapis.com/auth/drive.readonly",
-            "https://www.googleapis.com/auth/documents.readonly",
-        ],
+        scopes=list(scopes),
     )
-    return build("docs", "v1", credentials=creds)
 
 
-def _ensure_drive(sa_json_bytes: bytes):
+@contextmanager
+def _pooled_service(api: str, version: str, sa_json_bytes: bytes, scopes):
     """
-    Lazily instantiate a Google Drive API client using a Service Account.
+    Check out a Google API client for the given Service Account.
+
+    Reuses an idle client from the process-wide pool, or builds a new one
+    from the discovery document bundled with google-api-python-client
+    (static_discovery=True, no on-disk discovery cache, so no discovery
+    HTTP request is made). The client is returned to the pool on exit.
+
+    Raises:
+        RuntimeError: Missing dependencies (google-api-python-client / google-auth).
     """
+    key = (api, version, sa_json_bytes)
+    with _SERVICE_POOL_LOCK:
+        idle = _SERVICE_POOL.get(key)
+        service = idle.pop() if idle else None
+
+    if service is None:
+        build, _ = _google_imports()
+        service = build(
+            api,
+            version,
+            credentials=_credentials(sa_json_bytes, scopes),
+            cache_discovery=False,
+            static_discovery=True,
+        )
+
     try:
-        from googleapiclient.discovery import build
-        from google.oauth2 import service_account
-    except Exception as e:
-        raise RuntimeError(
-            "Google API client libraries are missing. "
-            "Add 'google-api-python-client' and 'google-auth' to requirements.txt."
-        ) from e
+        yield service
+    finally:
+        with _SERVICE_POOL_LOCK:
+            _SERVICE_POOL.setdefault(key, []).append(service)
 
-    creds = service_account.Credentials.from_service_account_info(
-        json.loads(sa_json_bytes.decode("utf-8")),
-        scopes=["https://www.googleapis.com/auth/drive.readonly"],
-    )
-    return build("drive", "v3", credentials=creds)
+
+def _ensure_docs(sa_json_bytes: bytes):
+    """
+    Lazily instantiate a Google Docs API client using a Service Account.
+
+    Parameters:
+        sa_json_bytes (bytes): Raw JSON of a Google Service Account.
+
+    Returns:
+        Context manager yielding a googleapiclient.discovery.Resource
+        (Docs API client, pooled process-wide).
+
+    Raises:
+        RuntimeError: Missing dependencies (google-api-python-client / google-auth).
+    """
+    return _pooled_service("docs", "v1", sa_json_bytes, _DOCS_SCOPES)
+
+
+def _ensure_drive(sa_json_bytes: bytes):
+    """
+    Lazily instantiate a Google Drive API client using a Service Account.
+    Returns a context manager yielding the pooled client.
+    """
+    return _pooled_service("drive", "v3", sa_json_bytes, _DRIVE_SCOPES)
 
 
 def _get_doc(file_id: str, sa_json_bytes: bytes):
     """
     Internal helper: retrieve a full Google Doc document structure.
     """
-    docs = _ensure_docs(sa_json_bytes)
-    return docs.documents().get(documentId=file_id).execute()
+    with _ensure_docs(sa_json_bytes) as docs:
+        return docs.documents().get(documentId=file_id).execute()
 
 
 # ==============================================================================
@@ -125,7 +196,7 @@ def gdoc_id_from_url(url: str) -> Optional[str]:
     """
     if not url:
         return None
-    m = re.search(r"/document/d/([a-zA-Z0-9_-]+)", url)
+    m = _DOC_ID_RE.search(url)
     return m.group(1) if m else None
 
 
@@ -150,7 +221,7 @@ def parse_anchor_from_url(url: str) -> Tuple[Optional[str], Optional[str]]:
         return "bookmark", url.split("#bookmark=")[1].split("&")[0]
 
     # tab fragments: ?tab=h.<frag> or ?tab=t.<frag>
-    m = re.search(r"[?#&]tab=([ht])\.([A-Za-z0-9_-]+)", url)
+    m = _TAB_ANCHOR_RE.search(url)
     if m:
         kind_code, frag = m.group(1), m.group(2)
         return (
@@ -164,28 +235,78 @@ def parse_anchor_from_url(url: str) -> Tuple[Optional[str], Optional[str]]:
 # Export DOCX
 # ==============================================================================
 
+DOCX_MIME = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+)
+
+# MediaIoBaseDownload defaults to 100 MB chunks (effectively one buffered
+# response); 1 MiB keeps each read small while still few round-trips.
+EXPORT_CHUNK_SIZE = 1024 * 1024
+
+
+# (file_id, modifiedTime) → (stored_at, docx bytes). A new revision of the
+# doc changes modifiedTime, so stale exports are never served.
+_EXPORT_CACHE: Dict[Tuple[str, str], Tuple[float, bytes]] = {}
+_EXPORT_CACHE_LOCK = threading.Lock()
+EXPORT_CACHE_MAX = 32
+EXPORT_CACHE_TTL = 3600  # seconds
+
+
+def _export_cache_get(key: Tuple[str, str]) -> Optional[bytes]:
+    """Return cached export bytes for key, dropping the entry if expired."""
+    with _EXPORT_CACHE_LOCK:
+        hit = _EXPORT_CACHE.get(key)
+        if hit is None:
+            return None
+        if time.monotonic() - hit[0] > EXPORT_CACHE_TTL:
+            del _EXPORT_CACHE[key]
+            return None
+        return hit[1]
+
+
+def _export_cache_put(key: Tuple[str, str], data: bytes) -> None:
+    """Store export bytes, evicting the oldest entry once full."""
+    with _EXPORT_CACHE_LOCK:
+        _EXPORT_CACHE.pop(key, None)
+        while len(_EXPORT_CACHE) >= EXPORT_CACHE_MAX:
+            _EXPORT_CACHE.pop(next(iter(_EXPORT_CACHE)))
+        _EXPORT_CACHE[key] = (time.monotonic(), data)
+
 
 def fetch_docx_from_gdoc(file_id: str, sa_json_bytes: bytes) -> io.BytesIO:
     """
     Export a Google Doc as a DOCX file using the Drive API.
 
     Returns:
-        io.BytesIO: In-memory DOCX file content.
+        io.BytesIO: In-memory DOCX file content (a fresh buffer per call).
+
+    Notes:
+        - The export is streamed straight into the buffer in
+          EXPORT_CHUNK_SIZE pieces, so no second full-size bytes copy exists.
+        - Exports are cached per (file_id, modifiedTime) for
+          EXPORT_CACHE_TTL seconds. A cheap metadata call checks the
+          revision first, so re-clicking on an unchanged doc skips the export.
     """
-    drive = _ensure_drive(sa_json_bytes)
-    request = drive.files().export(
-        fileId=file_id,
-        mimeType="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    )
-
-    buf = io.BytesIO()
     from googleapiclient.http import MediaIoBaseDownload
 
-    downloader = MediaIoBaseDownload(buf, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
+    with _ensure_drive(sa_json_bytes) as drive:
+        meta = drive.files().get(fileId=file_id, fields="modifiedTime").execute()
+        key = (file_id, meta.get("modifiedTime") or "")
+
+        cached = _export_cache_get(key)
+        if cached is not None:
+            return io.BytesIO(cached)
+
+        request = drive.files().export_media(fileId=file_id, mimeType=DOCX_MIME)
+
+        buf = io.BytesIO()
+        downloader = MediaIoBaseDownload(buf, request, chunksize=EXPORT_CHUNK_SIZE)
+        done = False
+        while not done:
+            _, done = downloader.next_chunk()
 
+    if key[1]:
+        _export_cache_put(key, buf.getvalue())
     buf.seek(0)
     return buf
 
@@ -0,0 +1,180 @@
+# ------------------------------------------------------------------------------
+# File: gpt_batch.py
+#
+# Purpose:
+#     Thin wrapper around the OpenAI Batch API used by the Canvas Import
+#     micro-app for large storyboards. Instead of one online
+#     chat.completions call per page, every page prompt is serialised into a
+#     single JSONL file, submitted as one batch job, and collected later.
+#
+# Why:
+#     - Batch jobs are billed at roughly half the online price.
+#     - Batch traffic uses a separate (higher) rate-limit pool, so 100+ page
+#       storyboards no longer trip RPM limits.
+#     - Turnaround is up to 24h, so this is opt-in from the UI.
+#
+# Flow:
+#     1. build_batch_jsonl()   → JSONL bytes, one request per page
+#     2. submit_batch()        → uploads the file + creates the batch job
+#     3. retrieve_batch()      → status polling (can be done from any session)
+#     4. read_batch_output()   → {custom_id: content | error}
+#        batch_errors()        → batch-level errors (e.g. invalid JSONL), which
+#                                leave both output files empty
+#
+# Notes:
+#     - This module is purely backend logic. No Streamlit, no UI.
+#     - custom_id values are opaque to OpenAI; the app uses "page_<index>".
+# ------------------------------------------------------------------------------
+
+import json
+from io import BytesIO
+from typing import Dict, Iterable, List, Tuple, Any
+
+from openai import OpenAI
+
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+
+# Batch statuses after which polling can stop.
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+# ==============================================================================
+# Build / Submit
+# ==============================================================================
+
+
+def build_batch_jsonl(requests: Iterable[Tuple[str, Dict[str, Any]]]) -> bytes:
+    """
+    Serialise (custom_id, payload) pairs into Batch API JSONL.
+
+    Parameters:
+        requests:
+            Iterable of (custom_id, chat.completions payload) tuples. The
+            payload is sent verbatim as the request body.
+
+    Returns:
+        bytes: UTF-8 JSONL, one request per line.
+    """
+    lines = []
+    for custom_id, body in requests:
+        lines.append(
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": BATCH_ENDPOINT,
+                    "body": body,
+                },
+                ensure_ascii=False,
+            )
+        )
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def submit_batch(client: OpenAI, jsonl_bytes: bytes, description: str = "") -> str:
+    """
+    Upload a JSONL request file and create a batch job for it.
+
+    Returns:
+        str: Batch ID (persist this to poll later).
+    """
+    upload = client.files.create(
+        file=("storyboard_batch.jsonl", BytesIO(jsonl_bytes)),
+        purpose="batch",
+    )
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata={"description": description} if description else None,
+    )
+    return batch.id
+
+
+# ==============================================================================
+# Poll / Collect
+# ==============================================================================
+
+
+def retrieve_batch(client: OpenAI, batch_id: str):
+    """
+    Retrieve the current batch object (status, request_counts, file ids).
+    """
+    return client.batches.retrieve(batch_id)
+
+
+def _read_jsonl_file(client: OpenAI, file_id: str):
+    """
+    Download a Batch output/error file and yield its parsed JSON lines.
+    """
+    text = client.files.content(file_id).text
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_batch_output(client: OpenAI, batch) -> Dict[str, Dict[str, Any]]:
+    """
+    Collect per-request results from a finished batch.
+
+    Returns:
+        Dict[str, Dict[str, Any]]:
+            custom_id → {"content": "<assistant text>"} on success, or
+            custom_id → {"error": "<message>"} when the request failed.
+    """
+    out: Dict[str, Dict[str, Any]] = {}
+
+    output_file_id = getattr(batch, "output_file_id", None)
+    if output_file_id:
+        for row in _read_jsonl_file(client, output_file_id):
+            cid = row.get("custom_id")
+            resp = row.get("response") or {}
+            body = resp.get("body") or {}
+            if row.get("error") or resp.get("status_code") != 200:
+                err = row.get("error") or body.get("error") or body
+                out[cid] = {"error": str(err)}
+                continue
+            try:
+                content = body["choices"][0]["message"]["content"] or ""
+            except Exception:
+                content = ""
+            out[cid] = {"content": content}
+
+    error_file_id = getattr(batch, "error_file_id", None)
+    if error_file_id:
+        for row in _read_jsonl_file(client, error_file_id):
+            cid = row.get("custom_id")
+            if cid not in out:
+                err = row.get("error") or (row.get("response") or {}).get("body")
+                out[cid] = {"error": str(err)}
+
+    return out
+
+
+def batch_errors(batch) -> List[str]:
+    """
+    Batch-level errors of a batch job, as readable strings.
+
+    A batch that fails validation (e.g. a malformed JSONL line) ends with
+    status "failed" and no output or error file; the reason is only on
+    batch.errors.
+
+    Returns:
+        List[str]: One "line N: code: message" entry per error ([] if none).
+    """
+    errors = getattr(batch, "errors", None)
+    out = []
+    for err in getattr(errors, "data", None) or []:
+        msg = getattr(err, "message", None) or str(err)
+        code = getattr(err, "code", None)
+        line = getattr(err, "line", None)
+        prefix = f"line {line}: " if line is not None else ""
+        out.append(f"{prefix}{code}: {msg}" if code else f"{prefix}{msg}")
+    return out
@@ -0,0 +1,262 @@
+# ------------------------------------------------------------------------------
+# File: gpt_parallel.py
+#
+# Purpose:
+#     Rate-limited, retrying fan-out of chat.completions requests for the
+#     Canvas Import micro-app's Visualize step.
+#
+# Why:
+#     - Parallel GPT calls without pacing burst straight into the account's
+#       requests-per-minute (RPM) and tokens-per-minute (TPM) limits; the
+#       429s then waste round-trips or surface as failed pages.
+#     - Pacing requests *before* sending them (token buckets) keeps the
+#       workers inside the limits; the occasional 429 / timeout / 5xx that
+#       still happens is retried with exponential backoff + jitter.
+#
+# Behaviour:
+#     - OpenAIRateLimiter holds two buckets (requests, tokens) refilled
+#       continuously at rpm/60 and tpm/60 per second, capped at one minute's
+#       budget. acquire() blocks until both can cover the request.
+#     - Token cost is estimated from the prompt size (~4 chars / token) plus
+#       the request's max_tokens, mirroring how OpenAI counts against TPM.
+#     - complete_many() returns (content, error, finish_reason) per payload, in
+#       input order;
+#       one failing request never affects the others.
+#     - stream_with_retry() gives the single-item streaming path the same
+#       pacing and retry policy. Calls run with the SDK's own retries off
+#       (max_retries=0), so MAX_ATTEMPTS is the real attempt budget.
+#     - Limiters are created by the caller and shared across calls (the app
+#       holds one per API key + model), so every request made for that
+#       account draws from the same buckets.
+#
+# Notes:
+#     - Threads, not asyncio: the OpenAI client is synchronous here and the
+#       rest of the app already uses ThreadPoolExecutor.
+#     - This module is purely backend logic. No Streamlit, no UI.
+# ------------------------------------------------------------------------------
+
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    RateLimitError,
+)
+
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 30.0  # seconds
+
+# Rough prompt-size heuristic used by OpenAI's own cookbook processor.
+CHARS_PER_TOKEN = 4
+
+
+# ==============================================================================
+# Token-bucket limiter
+# ==============================================================================
+
+
+class OpenAIRateLimiter:
+    """
+    Requests-per-minute + tokens-per-minute token buckets shared by workers.
+
+    Both buckets start full (one minute of budget) and refill continuously.
+    A request waits until both buckets can cover it, then takes its cost.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.rpm = float(requests_per_minute)
+        self.tpm = float(tokens_per_minute)
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one request and `tokens` tokens are available."""
+        # A single request larger than the whole bucket would never fit.
+        tokens = min(float(tokens), self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60.0 / self.rpm,
+                    (tokens - self._tokens) * 60.0 / self.tpm,
+                )
+            time.sleep(min(max(wait, 0.05), 5.0))
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """
+    Approximate TPM cost of a chat.completions payload (prompt + max output).
+    """
+    prompt_chars = len(json.dumps(payload.get("messages") or [], ensure_ascii=False))
+    return prompt_chars // CHARS_PER_TOKEN + int(payload.get("max_tokens") or 0)
+
+
+# ==============================================================================
+# Retry
+# ==============================================================================
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Retry-After from the response if present, else capped backoff + jitter."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt) + random.uniform(0, 0.5)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """429, timeouts, dropped connections and 5xx are worth another try."""
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def complete_with_retry(
+    client, payload: Dict[str, Any], limiter: Optional[OpenAIRateLimiter] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    One chat.completions call, paced by limiter and retried on transient errors.
+
+    Returns:
+        tuple[str, str | None]: Assistant message content ("" if empty) and
+        the choice's finish_reason ("length" means cut off at max_tokens).
+
+    Raises:
+        Exception: The last error once MAX_ATTEMPTS is exhausted, or any
+            non-retryable error immediately.
+    """
+    cost = estimate_tokens(payload)
+    # Retries are ours alone: SDK-level retries would multiply the attempt
+    # count and bypass the limiter.
+    no_retry = client.with_options(max_retries=0)
+    for attempt in range(MAX_ATTEMPTS):
+        if limiter is not None:
+            limiter.acquire(cost)
+        try:
+            response = no_retry.chat.completions.create(**payload)
+            choice = response.choices[0]
+            return choice.message.content or "", choice.finish_reason
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1 or not _is_retryable(e):
+                raise
+            time.sleep(_retry_delay(e, attempt))
+    return "", None
+
+
+def stream_with_retry(
+    client,
+    payload: Dict[str, Any],
+    limiter: Optional[OpenAIRateLimiter] = None,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> Tuple[str, Optional[str]]:
+    """
+    Streamed chat.completions call, paced and retried like complete_with_retry.
+
+    Parameters:
+        on_delta (callable | None): Called with each text delta as it
+            arrives (e.g. to refresh a live preview).
+
+    Returns:
+        tuple[str, str | None]: The full assistant text and finish_reason.
+
+    Behaviour:
+        - A transient error before the first delta is retried; once output
+          has started flowing the error is raised instead, so a retry can
+          never duplicate text already handed to on_delta.
+    """
+    cost = estimate_tokens(payload)
+    no_retry = client.with_options(max_retries=0)
+    for attempt in range(MAX_ATTEMPTS):
+        if limiter is not None:
+            limiter.acquire(cost)
+        chunks: List[str] = []
+        finish_reason = None
+        try:
+            stream = no_retry.chat.completions.create(**payload, stream=True)
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                finish_reason = choice.finish_reason or finish_reason
+                delta = choice.delta.content
+                if not delta:
+                    continue
+                chunks.append(delta)
+                if on_delta is not None:
+                    on_delta(delta)
+            return "".join(chunks), finish_reason
+        except Exception as e:
+            if chunks or attempt == MAX_ATTEMPTS - 1 or not _is_retryable(e):
+                raise
+            time.sleep(_retry_delay(e, attempt))
+    return "", None
+
+
+# ==============================================================================
+# Fan-out
+# ==============================================================================
+
+
+def complete_many(
+    client,
+    payloads: List[Dict[str, Any]],
+    max_workers: int,
+    limiter: Optional[OpenAIRateLimiter] = None,
+) -> List[Tuple[Optional[str], Optional[Exception], Optional[str]]]:
+    """
+    Run several chat.completions payloads concurrently within RPM/TPM limits.
+
+    Parameters:
+        max_workers (int): Upper bound on in-flight requests.
+        limiter (OpenAIRateLimiter | None): Shared pacing for the account;
+            pass the same instance to every call so separate batches of work
+            draw from one RPM/TPM budget. No pacing when None.
+
+    Returns:
+        list[tuple[str | None, Exception | None, str | None]]:
+        (content, error, finish_reason) per payload, in input order.
+    """
+    if not payloads:
+        return []
+
+    def _one(payload):
+        try:
+            content, finish_reason = complete_with_retry(client, payload, limiter)
+            return content, None, finish_reason
+        except Exception as e:
+            return None, e, None
+
+    workers = max(1, min(int(max_workers or 1), len(payloads)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_one, payloads))
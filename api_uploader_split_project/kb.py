@@ -10,6 +10,7 @@
 #
 #         • Creation of vector stores (beta + non-beta support)
 #         • Upload of files to vector stores (batch, legacy, fallback modes)
+#         • Multi-file uploads indexed as one server-side file batch
 #         • Graceful degradation when the user’s OpenAI SDK lacks VS support
 #
 # Behaviour:
@@ -27,7 +28,7 @@
 # ------------------------------------------------------------------------------
 
 from io import BytesIO
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 from openai import OpenAI
 import os
 
@@ -211,6 +212,26 @@ def create_vector_store(client: OpenAI, name: str = "Canvas Templates / KB") ->
 # ==============================================================================
 
 
+def _file_counts(batch) -> Dict[str, int]:
+    """
+    Per-file indexing outcome of a vector-store file batch.
+
+    A batch reports status "completed" even when some of its files failed to
+    index, so callers must check "failed" as well as the status.
+
+    Returns:
+        Dict[str, int]: {"completed": n, "failed": n}, or {} when the SDK
+        object carries no file_counts.
+    """
+    counts = getattr(batch, "file_counts", None)
+    if counts is None:
+        return {}
+    return {
+        "completed": getattr(counts, "completed", 0) or 0,
+        "failed": getattr(counts, "failed", 0) or 0,
+    }
+
+
 def upload_file_to_vs(
     client: OpenAI, vector_store_id: str, data: BytesIO, filename: str
 ) -> Dict[str, Any]:
@@ -236,6 +257,8 @@ def upload_file_to_vs(
                 "via": "beta.file_batches" | "beta.files.create+attach" | ...
                 "file_id": "...",     # only in fallback
                 "hint": "...",        # only in fallback (no VS support)
+                "completed": n,       # file batch only: files indexed
+                "failed": n,          # file batch only: files that failed
             }
     """
     if not vector_store_id:
@@ -253,6 +276,7 @@ def upload_file_to_vs(
             return {
                 "status": getattr(batch, "status", "completed"),
                 "via": "beta.file_batches",
+                **_file_counts(batch),
             }
         except AttributeError:
             # Some mid-range SDKs lack file_batches entirely → proceed below
@@ -290,3 +314,88 @@ def upload_file_to_vs(
             "Upgrade with: pip install --upgrade openai"
         ),
     }
+
+
+# ==============================================================================
+# Upload Several Files to Vector Store
+# ==============================================================================
+
+# Client-level retries (exponential backoff on 429 / 5xx / connection errors)
+# applied to the batch upload; the SDK default is 2.
+KB_UPLOAD_MAX_RETRIES = 5
+
+
+def upload_files_to_vs(
+    client: OpenAI, vector_store_id: str, files: List[Tuple[BytesIO, str]]
+) -> Dict[str, Any]:
+    """
+    Upload several file objects to a vector store in one file batch.
+
+    Parameters:
+        client (OpenAI): Authenticated OpenAI SDK client.
+        vector_store_id (str): The VS to attach the files to.
+        files (List[Tuple[BytesIO, str]]): (file object, original name) pairs.
+
+    Returns:
+        Dict[str, Any]: Same status shape as upload_file_to_vs(), plus
+        "count" (number of files submitted) on success. "completed" /
+        "failed" give the per-file indexing outcome; a "completed" batch
+        can still contain failed files.
+
+    Behaviour:
+        - A single file is delegated to upload_file_to_vs() unchanged.
+        - Otherwise every file goes into one
+          beta.vector_stores.file_batches.upload_and_poll call, so uploads
+          and indexing happen server-side in one batch instead of N
+          create + attach round-trips.
+        - SDKs without file_batches fall back to one upload_file_to_vs()
+          call per file; the first non-completed result is returned.
+    """
+    if not vector_store_id:
+        raise ValueError("vector_store_id is required")
+    if not files:
+        raise ValueError("files is empty")
+
+    if len(files) == 1:
+        data, filename = files[0]
+        return upload_file_to_vs(client, vector_store_id, data, filename)
+
+    # ----- Batch upload (preferred) -------------------------------------------
+    if _has_beta_vs(client):
+        streams = []
+        for data, filename in files:
+            data.seek(0)
+            streams.append(_name_stream(data, filename))
+        try:
+            retrying = client.with_options(max_retries=KB_UPLOAD_MAX_RETRIES)
+            batch = retrying.beta.vector_stores.file_batches.upload_and_poll(
+                vector_store_id=vector_store_id,
+                files=streams,
+            )
+            return {
+                "status": getattr(batch, "status", "completed"),
+                "via": "beta.file_batches",
+                "count": len(files),
+                **_file_counts(batch),
+            }
+        except AttributeError:
+            # No file_batches on this SDK → per-file fallback below
+            pass
+        except Exception as e:
+            return {"status": "error", "error": str(e), "via": "beta.file_batches"}
+
+    # ----- Per-file fallback --------------------------------------------------
+    results = [
+        upload_file_to_vs(client, vector_store_id, data, filename)
+        for data, filename in files
+    ]
+    for res in results:
+        if res.get("status") != "completed":
+            return res
+    return {
+        "status": "completed",
+        "via": results[0].get("via"),
+        "count": len(files),
+        "completed": len(files),
+        "failed": 0,
+    }
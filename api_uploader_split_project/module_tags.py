@@ -78,8 +78,13 @@ def split_text_by_module_tags(text: str) -> List[Dict]:
         - Strips whitespace around name and content.
         - Case-insensitive matching.
         - Non-overlapping sequential matching from left to right.
+        - Returns [] immediately when the text has no "module_name" at all.
     """
     out: List[Dict] = []
+    if not text or "module_name" not in text.lower():
+        # Fast path: wrong/untagged document — skip the regex walk entirely.
+        return out
+
     pos = 0
 
     while True:
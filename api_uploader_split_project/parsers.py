@@ -16,36 +16,51 @@
 #       </canvas_page>
 #
 # Behaviour:
-#     - Logic preserved 100% from original version.
-#     - Regex is intentionally tolerant:
+#     - DOCX text comes from one lxml iterparse pass over word/document.xml,
+#       streaming body paragraphs (text matches python-docx Paragraph.text)
+#       without building a full document object.
+#     - Pages are cut by a linear tag walk: each opening tag is paired with
+#       the first closing tag after it, and the scan resumes from there.
+#     - Tag diagnostics (scan_canvas_page_tags) use a single alternation
+#       scan over the text for both opening and closing tags.
+#     - Tag matching is intentionally tolerant:
 #           • Case-insensitive
 #           • Allows attributes inside <canvas_page ...>
-#           • DOTALL mode for multi-line content
+#           • Page content may span any number of lines
 #
 # External dependencies:
-#     - python-docx (Document)
+#     - lxml (streaming iterparse of word/document.xml; pinned in requirements.txt)
 # ------------------------------------------------------------------------------
 
 import re
-from typing import List
-from docx import Document
+import zipfile
+from io import BytesIO
+from typing import Iterator, List
+from lxml import etree
 
 
 # ==============================================================================
 # Regular Expression for Canvas Page Blocks
 # ==============================================================================
 
-# Matches:
-#   <canvas_page ...> ... </canvas_page>
+# Opening tag of a Canvas page block: <canvas_page> or <canvas_page attr="...">
 #
 # Notes:
 #   - \b allows <canvas_page> or <canvas_page attr="...">
-#   - DOTALL ensures multi-line matching
 #   - Case-insensitive for user flexibility
+#   - Pages are cut by searching for the next closing tag from here (see
+#     extract_canvas_pages_from_text), instead of one DOTALL (.*?) pattern
+#     that rescans to the end of the text for every unclosed tag.
 #
-_CANVAS_PAGE_RE = re.compile(
-    r"<canvas_page\b[^>]*>(.*?)</canvas_page\s*>",
-    re.IGNORECASE | re.DOTALL,
+_CANVAS_PAGE_OPEN_RE = re.compile(r"<canvas_page\b[^>]*>", re.IGNORECASE)
+
+# Closing tag of a Canvas page block (tolerates whitespace before ">").
+_CANVAS_PAGE_END_RE = re.compile(r"</canvas_page\s*>", re.IGNORECASE)
+
+# Either tag in one alternation, so diagnostics scan the text once;
+# the "end" group tells the two apart.
+_CANVAS_PAGE_TAG_RE = re.compile(
+    r"<canvas_page\b|(?P<end></canvas_page\s*>)", re.IGNORECASE
 )
 
 
@@ -70,18 +85,29 @@ def extract_canvas_pages_from_text(text: str) -> List[str]:
                 - whitespace trimmed
 
     Behaviour:
-        - Returns [] if text is empty/None.
+        - Returns [] if text is empty/None or has no "canvas_page" substring.
         - Does not transform or sanitize HTML inside tags.
         - Downstream tools expect the tag wrappers to remain intact.
     """
-    if not text:
+    if not text or "canvas_page" not in text.lower():
+        # Fast path: no tag text at all, so no regex scan is needed.
         return []
 
     pages: List[str] = []
 
-    for m in _CANVAS_PAGE_RE.finditer(text):
-        inner = m.group(1).strip()
+    # Linear tag walk: opening tag → first closing tag after it → resume.
+    pos = 0
+    while True:
+        start = _CANVAS_PAGE_OPEN_RE.search(text, pos)
+        if not start:
+            break
+        end = _CANVAS_PAGE_END_RE.search(text, start.end())
+        if not end:
+            # No closing tag left anywhere after this point.
+            break
+        inner = text[start.end() : end.start()].strip()
         pages.append(f"<canvas_page>\n{inner}\n</canvas_page>")
+        pos = end.end()
 
     return pages
 
@@ -91,28 +117,166 @@ def extract_canvas_pages_from_text(text: str) -> List[str]:
 # ==============================================================================
 
 
+def read_docx_bytes(docx_like) -> bytes:
+    """
+    Return the full content of a DOCX source as bytes, without consuming it.
+
+    Parameters:
+        docx_like:
+            bytes, a path, a Streamlit UploadedFile / BytesIO (anything with
+            getvalue()), or a generic seekable file-like object.
+
+    Behaviour:
+        - Prefers getvalue(), which returns the whole buffer regardless of
+          the current cursor position.
+        - Generic file-likes are rewound before reading, so a previous
+          read() elsewhere cannot yield an empty document.
+    """
+    if isinstance(docx_like, (bytes, bytearray)):
+        return bytes(docx_like)
+    if hasattr(docx_like, "getvalue"):
+        return docx_like.getvalue()
+    if hasattr(docx_like, "read"):
+        if hasattr(docx_like, "seek"):
+            docx_like.seek(0)
+        return docx_like.read()
+    with open(docx_like, "rb") as f:
+        return f.read()
+
+
 def extract_canvas_pages(docx_like) -> List[str]:
     """
     Extract <canvas_page> blocks from a DOCX file.
 
     Parameters:
         docx_like:
-            A file-like object or path acceptable to python-docx's Document().
+            DOCX bytes, a path, or a file-like object (see read_docx_bytes).
 
     Returns:
         List[str]:
             Same output as extract_canvas_pages_from_text().
 
     Behaviour:
-        - Reads all paragraphs in order.
+        - Reads all body paragraphs in order (docx_bytes_to_text).
         - Joins them with newline separators.
         - Passes the resulting text into the text-based extractor.
     """
-    doc = Document(docx_like)
-    text = "\n".join(p.text for p in doc.paragraphs)
+    text = docx_bytes_to_text(read_docx_bytes(docx_like))
     return extract_canvas_pages_from_text(text)
 
 
+# WordprocessingML element tags (Clark notation) used by the streaming reader.
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_W_P = _W + "p"
+_W_R = _W + "r"
+_W_HYPERLINK = _W + "hyperlink"
+_W_T = _W + "t"
+_W_TAB = _W + "tab"
+_W_PTAB = _W + "ptab"
+_W_BR = _W + "br"
+_W_CR = _W + "cr"
+_W_NO_BREAK_HYPHEN = _W + "noBreakHyphen"
+_W_TYPE = _W + "type"
+_W_TBL = _W + "tbl"
+
+
+def _run_text(r_el) -> str:
+    """
+    Text of a single w:r element, as python-docx's Run.text builds it.
+
+    Only direct run content counts: w:t text, w:tab / w:ptab → tab,
+    w:cr → newline, w:noBreakHyphen → "-", and w:br → newline for
+    text-wrapping breaks only (page / column breaks add nothing). Drawings,
+    textboxes and mc:AlternateContent inside the run are never descended
+    into, so their text is neither duplicated nor glued onto the paragraph.
+    """
+    parts = []
+    for el in r_el.iterchildren():
+        tag = el.tag
+        if tag == _W_T:
+            parts.append(el.text or "")
+        elif tag in (_W_TAB, _W_PTAB):
+            parts.append("\t")
+        elif tag == _W_CR:
+            parts.append("\n")
+        elif tag == _W_BR:
+            if el.get(_W_TYPE, "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag == _W_NO_BREAK_HYPHEN:
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(p_el) -> str:
+    """
+    Text of a single w:p element, matching python-docx's Paragraph.text:
+    the paragraph's own w:r children plus the runs of its w:hyperlink
+    children, in order (see _run_text).
+    """
+    parts = []
+    for child in p_el.iterchildren(_W_R, _W_HYPERLINK):
+        if child.tag == _W_R:
+            parts.append(_run_text(child))
+        else:
+            parts.extend(_run_text(r) for r in child.iterchildren(_W_R))
+    return "".join(parts)
+
+
+_W_BODY = _W + "body"
+
+
+def iter_docx_blocks(docx_bytes: bytes) -> Iterator[str]:
+    """
+    Stream the body paragraphs of a DOCX as text, in document order.
+
+    Parameters:
+        docx_bytes (bytes):
+            Complete .docx file content (upload buffer or Drive export).
+
+    Yields:
+        str:
+            One entry per body-level paragraph — the same paragraphs
+            python-docx's Document.paragraphs returns. Tables are skipped,
+            as they always have been.
+
+    Behaviour:
+        - Uses lxml.etree.iterparse on word/document.xml instead of building
+          the full python-docx object model.
+        - Each body-level element is cleared (and its processed siblings
+          dropped) once handled, so memory stays bounded by one block.
+        - Paragraphs nested in tables are left intact until their table ends,
+          then discarded with it.
+    """
+    with zipfile.ZipFile(BytesIO(docx_bytes)) as zf, zf.open("word/document.xml") as f:
+        for _event, el in etree.iterparse(f, events=("end",), tag=(_W_P, _W_TBL)):
+            parent = el.getparent()
+            if parent is None or parent.tag != _W_BODY:
+                continue
+
+            if el.tag == _W_P:
+                yield _paragraph_text(el)
+
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+
+
+def docx_bytes_to_text(docx_bytes: bytes) -> str:
+    """
+    Flatten a DOCX (given as raw bytes) into newline-joined text.
+
+    Returns:
+        str:
+            Body paragraphs in document order (see iter_docx_blocks), joined
+            with newlines — the same shape the text-based extractors expect.
+
+    Behaviour:
+        - Pure function of its input, so callers can safely memoise it
+          (the Streamlit app caches it with st.cache_data).
+    """
+    return "\n".join(iter_docx_blocks(docx_bytes))
+
+
 # ==============================================================================
 # Diagnostics / Debug Helpers
 # ==============================================================================
@@ -132,6 +296,13 @@ def scan_canvas_page_tags(text: str):
                 "balanced": <bool>
             }
     """
-    starts = len(list(re.finditer(r"(?i)<canvas_page\b", text)))
-    ends = len(list(re.finditer(r"(?i)</canvas_page\s*>", text)))
+    if not text or "canvas_page" not in text.lower():
+        return {"starts": 0, "ends": 0, "balanced": True}
+
+    starts = ends = 0
+    for m in _CANVAS_PAGE_TAG_RE.finditer(text):
+        if m.lastgroup == "end":
+            ends += 1
+        else:
+            starts += 1
     return {"starts": starts, "ends": ends, "balanced": (starts == ends)}
@@ -16,13 +16,14 @@
 #     - No GPT formatting, parsing, or upload logic is touched here.
 #
 # Dependencies:
-#     - requests
+#     - requests (via canvas_http)
 #     - Canvas REST API v1
 #
 # ------------------------------------------------------------------------------
 
-import requests
-from typing import Dict, Any, Optional
+import canvas_http  # pooled keep-alive session shared by all Canvas helpers
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 
 
 # ==============================================================================
@@ -30,40 +31,9 @@ from typing import Dict, Any, Optional
 # ==============================================================================
 
 
-def _headers(token: str) -> Dict[str, str]:
-    """
-    Return Canvas-compatible Authorization headers.
-
-    Parameters:
-        token (str): Canvas API token.
-
-    Returns:
-        dict: {'Authorization': 'Bearer <token>'}
-    """
-    return {"Authorization": f"Bearer {token}"}
-
-
-def _url(base: str, path: str) -> str:
-    """
-    Build a fully qualified Canvas API URL.
-
-    Behaviour:
-        - Supports both formats:
-            ▸ "https://domain.instructure.com"
-            ▸ "domain.instructure.com"
-        - Ensures no double slashes.
-
-    Parameters:
-        base (str): Canvas domain or full base url.
-        path (str): API route (starting with /api/...).
-
-    Returns:
-        str: Fully qualified URL.
-    """
-    base = base.rstrip("/")
-    if base.startswith("http"):
-        return f"{base}{path}"
-    return f"https://{base}{path}"
+# URL + auth-header builders live in canvas_http (one copy for every module).
+_headers = canvas_http.auth_headers
+_url = canvas_http.api_url
 
 
 # ==============================================================================
@@ -104,9 +74,9 @@ def add_quiz(
         }
     }
 
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
     r.raise_for_status()
-    return r.json().get("id")
+    return canvas_http.response_json(r).get("id")
 
 
 # ==============================================================================
@@ -115,7 +85,12 @@ def add_quiz(
 
 
 def add_quiz_question(
-    base: str, course_id: str, quiz_id: int, q: Dict[str, Any], token: str
+    base: str,
+    course_id: str,
+    quiz_id: int,
+    q: Dict[str, Any],
+    token: str,
+    position: Optional[int] = None,
 ) -> bool:
     """
     Add a single question to a Classic Quiz.
@@ -137,6 +112,9 @@ def add_quiz_question(
             }
 
         token (str): Canvas API token.
+        position (int, optional):
+            Explicit 1-based question position. Required when questions are
+            posted concurrently, otherwise Canvas orders them by arrival.
 
     Returns:
         bool:
@@ -158,11 +136,44 @@ def add_quiz_question(
             "answers": q.get("answers", []),
         }
     }
+    if position is not None:
+        payload["question"]["position"] = position
 
-    r = requests.post(url, headers=_headers(token), json=payload)
+    r = canvas_http.post(url, headers=_headers(token), json=payload)
 
     try:
         r.raise_for_status()
         return True
     except Exception:
         return False
+
+
+def add_quiz_questions(
+    base: str,
+    course_id: str,
+    quiz_id: int,
+    questions: List[Dict[str, Any]],
+    token: str,
+    max_workers: int = 6,
+) -> List[bool]:
+    """
+    Add several questions to a Classic Quiz concurrently.
+
+    Each question is posted with its explicit position, so the final order
+    matches `questions` regardless of which request finishes first.
+
+    Returns:
+        List[bool]: One add_quiz_question() result per question, in order.
+    """
+    if not questions:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(questions))) as pool:
+        return list(
+            pool.map(
+                lambda iq: add_quiz_question(
+                    base, course_id, quiz_id, iq[1], token, position=iq[0]
+                ),
+                enumerate(questions, start=1),
+            )
+        )
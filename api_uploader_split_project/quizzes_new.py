@@ -34,8 +34,12 @@
 #     - This module is purely backend logic. No Streamlit, no UI, no GPT.
 # ------------------------------------------------------------------------------
 
+import html
+import re
 import uuid
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
+import canvas_http  # pooled keep-alive session shared by all Canvas helpers
 
 
 # ==============================================================================
@@ -48,14 +52,14 @@ def _BASE(domain: str) -> str:
     Normalize domain into a fully-qualified Canvas base URL.
     Example: "canvas.myuni.edu" → "https://canvas.myuni.edu"
     """
-    return f"https://{domain}".rstrip("/")
+    return canvas_http.api_url(domain, "")
 
 
 def _H(token: str) -> dict:
     """
     Authorization headers used for all New Quizzes API calls.
     """
-    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    return {**canvas_http.auth_headers(token), "Content-Type": "application/json"}
 
 
 # ==============================================================================
@@ -93,10 +97,10 @@ def add_new_quiz(domain, course_id, title, description_html, token, points_possi
         }
     }
 
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
+    r = canvas_http.post(url, headers=_H(token), json=payload, timeout=60)
 
     try:
-        data = r.json()
+        data = canvas_http.response_json(r)
     except Exception:
         data = None
 
@@ -107,6 +111,91 @@ def add_new_quiz(domain, course_id, title, description_html, token, points_possi
     return None, (data or r.text), r.status_code, (data or r.text)
 
 
+# ==============================================================================
+# Shared Item Plumbing
+# ==============================================================================
+
+
+def _items_url(domain, course_id, assignment_id) -> str:
+    """New Quizzes items endpoint for one quiz."""
+    return (
+        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
+    )
+
+
+def _base_entry(q, slug) -> dict:
+    """Fields common to every item entry (title, body, calculator)."""
+    return {
+        "interaction_type_slug": slug,
+        "title": q.get("question_name") or "Question",
+        "item_body": q.get("question_text") or "",
+        "calculator_type": "none",
+    }
+
+
+def _item_payload(q, entry, position) -> dict:
+    """
+    Wrap an item entry in the Canvas item envelope, adding question-level
+    feedback (non-empty values only) when q provides it.
+    """
+    fb = q.get("feedback") or {}
+    qlevel = {k: v for k, v in fb.items() if v}
+    if qlevel:
+        entry["feedback"] = qlevel
+
+    return {
+        "item": {
+            "entry_type": "Item",
+            "points_possible": q.get("points_possible", 1),
+            "position": position,
+            "entry": entry,
+        }
+    }
+
+
+_P_TMPL = "<p>{}</p>".format
+
+# GPT answers may already carry inline markup (<code>, <sub>, <em>, &lt; …).
+_MARKUP_RE = re.compile(r"</?[A-Za-z][^<>]*>|&(?:[A-Za-z]+|#\d+|#x[0-9A-Fa-f]+);")
+
+
+def _p(text) -> str:
+    """
+    Answer/prompt text as a <p> item body.
+
+    Text that already contains HTML tags or entities is passed through
+    unchanged (escaping it would render the markup literally); only plain
+    text is escaped, so a bare "<" or "&" cannot break the item body.
+    """
+    text = str(text or "")
+    if not _MARKUP_RE.search(text):
+        text = html.escape(text, quote=False)
+    return _P_TMPL(text)
+
+
+def _post_item(domain, course_id, assignment_id, payload, token):
+    """
+    POST one prepared item payload.
+
+    Returns:
+        (ok: bool, debug: any)
+    """
+    r = canvas_http.post(
+        _items_url(domain, course_id, assignment_id),
+        headers=_H(token),
+        json=payload,
+        timeout=60,
+    )
+
+    if r.status_code in (200, 201):
+        return True, None
+
+    try:
+        return False, canvas_http.response_json(r)
+    except Exception:
+        return False, r.text
+
+
 # ==============================================================================
 # Choice-Based Questions (MCQ, Multi-Select, True/False)
 # ==============================================================================
@@ -124,31 +213,16 @@ def _mc_scoring_for(answers):
     return "Set", correct
 
 
-def add_choice_item(domain, course_id, assignment_id, q, token, position=1):
+def _choice_entry(q):
     """
-    Add a choice-style item.
-
-    Supports:
-        - multiple_choice_question
-        - multiple_answers_question
-        - true_false_question
-
-    Features:
-        - Per-answer feedback
-        - Question-level feedback
-        - Shuffle rules
-        - Multi-correct scoring logic (Set vs Equivalence)
+    Entry for multiple_choice / multiple_answers / true_false questions,
+    with per-answer feedback and Set vs Equivalence scoring.
 
-    Returns:
-        (ok: bool, debug: any)
+    Returns None when the question has no answers.
     """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
     answers = q.get("answers", []) or []
     if not answers:
-        return False, "No answers provided."
+        return None
 
     # Build choice options + per-answer feedback
     choices = []
@@ -158,59 +232,53 @@ def add_choice_item(domain, course_id, assignment_id, q, token, position=1):
         cid = a.get("_choice_id") or str(uuid.uuid4())
         a["_choice_id"] = cid
 
-        choices.append(
-            {"id": cid, "position": idx, "itemBody": f"<p>{a.get('text', '')}</p>"}
-        )
+        choices.append({"id": cid, "position": idx, "itemBody": _p(a.get("text"))})
 
         if a.get("feedback"):
             answer_feedback[cid] = a["feedback"]
 
     scoring_algorithm, scoring_value = _mc_scoring_for(answers)
 
-    entry = {
-        "interaction_type_slug": "choice",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-        "interaction_data": {"choices": choices},
-        "properties": {
-            "shuffleRules": {
-                "choices": {"toLock": [], "shuffled": bool(q.get("shuffle", False))}
-            },
-            "varyPointsByAnswer": False,
+    entry = _base_entry(q, "choice")
+    entry["interaction_data"] = {"choices": choices}
+    entry["properties"] = {
+        "shuffleRules": {
+            "choices": {"toLock": [], "shuffled": bool(q.get("shuffle", False))}
         },
-        "scoring_algorithm": scoring_algorithm,
-        "scoring_data": {"value": scoring_value},
+        "varyPointsByAnswer": False,
     }
-
-    # Question-level feedback
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
+    entry["scoring_algorithm"] = scoring_algorithm
+    entry["scoring_data"] = {"value": scoring_value}
 
     # Per-answer feedback
     if answer_feedback:
         entry["answer_feedback"] = answer_feedback
+    return entry
 
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
 
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
+def add_choice_item(domain, course_id, assignment_id, q, token, position=1):
+    """
+    Add a choice-style item.
 
-    if r.status_code in (200, 201):
-        return True, None
+    Supports:
+        - multiple_choice_question
+        - multiple_answers_question
+        - true_false_question
 
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+    Features:
+        - Per-answer feedback
+        - Question-level feedback
+        - Shuffle rules
+        - Multi-correct scoring logic (Set vs Equivalence)
+
+    Returns:
+        (ok: bool, debug: any)
+    """
+    entry = _choice_entry(q)
+    if entry is None:
+        return False, "No answers provided."
+    payload = _item_payload(q, entry, position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
 
 # ==============================================================================
@@ -218,52 +286,25 @@ def add_choice_item(domain, course_id, assignment_id, q, token, position=1):
 # ==============================================================================
 
 
+def _short_answer_entry(q):
+    """Entry for short_answer_question (case-insensitive equivalence)."""
+    acceptable = [a.get("text", "") for a in (q.get("answers") or []) if a.get("text")]
+
+    entry = _base_entry(q, "short_answer")
+    entry["interaction_data"] = {"caseSensitive": False}
+    entry["scoring_algorithm"] = "Equivalence"
+    entry["scoring_data"] = {"values": acceptable}
+    return entry
+
+
 def add_short_answer_item(domain, course_id, assignment_id, q, token, position=1):
     """
     Supports: short_answer_question
     Acceptable answers come from q['answers'] = [{'text': '...'}, ...].
     Case-insensitive equivalence.
     """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
-    acceptable = [a.get("text", "") for a in (q.get("answers") or []) if a.get("text")]
-
-    entry = {
-        "interaction_type_slug": "short_answer",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-        "interaction_data": {"caseSensitive": False},
-        "scoring_algorithm": "Equivalence",
-        "scoring_data": {"values": acceptable},
-    }
-
-    # Question-level feedback
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
-
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
-
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
-
-    if r.status_code in (200, 201):
-        return True, None
-
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+    payload = _item_payload(q, _short_answer_entry(q), position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
 
 # ==============================================================================
@@ -271,45 +312,18 @@ def add_short_answer_item(domain, course_id, assignment_id, q, token, position=1
 # ==============================================================================
 
 
+def _essay_entry(q):
+    """Entry for essay_question (no scoring algorithm)."""
+    return _base_entry(q, "essay")
+
+
 def add_essay_item(domain, course_id, assignment_id, q, token, position=1):
     """
     Supports: essay_question
     Essay items contain no scoring algorithm; instructor-graded.
     """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
-    entry = {
-        "interaction_type_slug": "essay",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-    }
-
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
-
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
-
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
-
-    if r.status_code in (200, 201):
-        return True, None
-
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+    payload = _item_payload(q, _essay_entry(q), position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
 
 # ==============================================================================
@@ -317,21 +331,8 @@ def add_essay_item(domain, course_id, assignment_id, q, token, position=1):
 # ==============================================================================
 
 
-def add_fimb_item(domain, course_id, assignment_id, q, token, position=1):
-    """
-    Supports: fill_in_multiple_blanks_question
-
-    q['question_text']
-        must contain placeholders: {{blank_id}}
-
-    q['answers']
-        [{'blank_id': 'b1', 'text': '2'},
-         {'blank_id': 'b2', 'text': 'water'}, ...]
-    """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
+def _fimb_entry(q):
+    """Entry for fill_in_multiple_blanks_question (answers grouped by blank)."""
     blanks = {}
     for a in q.get("answers") or []:
         b = a.get("blank_id")
@@ -339,39 +340,26 @@ def add_fimb_item(domain, course_id, assignment_id, q, token, position=1):
         if b and t:
             blanks.setdefault(b, []).append(t)
 
-    entry = {
-        "interaction_type_slug": "fill_in_multiple_blanks",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-        "scoring_algorithm": "Equivalence",
-        "scoring_data": {"values": blanks},
-        "interaction_data": {"blanks": [{"id": k} for k in blanks.keys()]},
-    }
-
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
+    entry = _base_entry(q, "fill_in_multiple_blanks")
+    entry["scoring_algorithm"] = "Equivalence"
+    entry["scoring_data"] = {"values": blanks}
+    entry["interaction_data"] = {"blanks": [{"id": k} for k in blanks.keys()]}
+    return entry
 
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
 
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
+def add_fimb_item(domain, course_id, assignment_id, q, token, position=1):
+    """
+    Supports: fill_in_multiple_blanks_question
 
-    if r.status_code in (200, 201):
-        return True, None
+    q['question_text']
+        must contain placeholders: {{blank_id}}
 
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+    q['answers']
+        [{'blank_id': 'b1', 'text': '2'},
+         {'blank_id': 'b2', 'text': 'water'}, ...]
+    """
+    payload = _item_payload(q, _fimb_entry(q), position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
 
 # ==============================================================================
@@ -379,17 +367,8 @@ def add_fimb_item(domain, course_id, assignment_id, q, token, position=1):
 # ==============================================================================
 
 
-def add_matching_item(domain, course_id, assignment_id, q, token, position=1):
-    """
-    Supports: matching_question
-
-    q['matches']
-        [{'prompt': 'H2O', 'match': 'water'}, ...]
-    """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
+def _matching_entry(q):
+    """Entry for matching_question (one stem/choice pair per match)."""
     stems = []
     choices = []
     pairs = []
@@ -398,49 +377,28 @@ def add_matching_item(domain, course_id, assignment_id, q, token, position=1):
         sid = str(uuid.uuid4())
         cid = str(uuid.uuid4())
 
-        stems.append(
-            {"id": sid, "position": idx, "itemBody": f"<p>{m.get('prompt', '')}</p>"}
-        )
+        stems.append({"id": sid, "position": idx, "itemBody": _p(m.get("prompt"))})
 
-        choices.append(
-            {"id": cid, "position": idx, "itemBody": f"<p>{m.get('match', '')}</p>"}
-        )
+        choices.append({"id": cid, "position": idx, "itemBody": _p(m.get("match"))})
 
         pairs.append({"stem_id": sid, "choice_id": cid})
 
-    entry = {
-        "interaction_type_slug": "matching",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-        "interaction_data": {"stems": stems, "choices": choices},
-        "scoring_algorithm": "Equivalence",
-        "scoring_data": {"pairs": pairs},
-    }
-
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
-
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
+    entry = _base_entry(q, "matching")
+    entry["interaction_data"] = {"stems": stems, "choices": choices}
+    entry["scoring_algorithm"] = "Equivalence"
+    entry["scoring_data"] = {"pairs": pairs}
+    return entry
 
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
 
-    if r.status_code in (200, 201):
-        return True, None
+def add_matching_item(domain, course_id, assignment_id, q, token, position=1):
+    """
+    Supports: matching_question
 
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+    q['matches']
+        [{'prompt': 'H2O', 'match': 'water'}, ...]
+    """
+    payload = _item_payload(q, _matching_entry(q), position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
 
 # ==============================================================================
@@ -448,6 +406,18 @@ def add_matching_item(domain, course_id, assignment_id, q, token, position=1):
 # ==============================================================================
 
 
+def _numerical_entry(q):
+    """Entry for numerical_question (exact value with optional tolerance)."""
+    na = q.get("numerical_answer") or {}
+    exact = na.get("exact")
+    tol = na.get("tolerance", 0)
+
+    entry = _base_entry(q, "numeric")
+    entry["scoring_algorithm"] = "Numeric"
+    entry["scoring_data"] = {"value": exact, "tolerance": tol}
+    return entry
+
+
 def add_numerical_item(domain, course_id, assignment_id, q, token, position=1):
     """
     Supports: numerical_question
@@ -457,51 +427,43 @@ def add_numerical_item(domain, course_id, assignment_id, q, token, position=1):
          'tolerance': 0.5   # optional
     }
     """
-    url = (
-        f"{_BASE(domain)}/api/quiz/v1/courses/{course_id}/quizzes/{assignment_id}/items"
-    )
-
-    na = q.get("numerical_answer") or {}
-    exact = na.get("exact")
-    tol = na.get("tolerance", 0)
-
-    entry = {
-        "interaction_type_slug": "numeric",
-        "title": q.get("question_name") or "Question",
-        "item_body": q.get("question_text") or "",
-        "calculator_type": "none",
-        "scoring_algorithm": "Numeric",
-        "scoring_data": {"value": exact, "tolerance": tol},
-    }
+    payload = _item_payload(q, _numerical_entry(q), position)
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
-    fb = q.get("feedback") or {}
-    qlevel = {k: v for k, v in fb.items() if v}
-    if qlevel:
-        entry["feedback"] = qlevel
 
-    payload = {
-        "item": {
-            "entry_type": "Item",
-            "points_possible": q.get("points_possible", 1),
-            "position": position,
-            "entry": entry,
-        }
-    }
+# ==============================================================================
+# Dispatcher — Route to Correct Builder
+# ==============================================================================
 
-    r = requests.post(url, headers=_H(token), json=payload, timeout=60)
+# question_type → entry builder
+_ENTRY_BUILDERS = {
+    "multiple_choice_question": _choice_entry,
+    "multiple_answers_question": _choice_entry,
+    "true_false_question": _choice_entry,
+    "short_answer_question": _short_answer_entry,
+    "essay_question": _essay_entry,
+    "fill_in_multiple_blanks_question": _fimb_entry,
+    "matching_question": _matching_entry,
+    "numerical_question": _numerical_entry,
+}
 
-    if r.status_code in (200, 201):
-        return True, None
 
-    try:
-        return False, r.json()
-    except Exception:
-        return False, r.text
+def build_item_payload(q, position=1):
+    """
+    Build the Canvas item payload for a question without any network I/O.
 
+    Returns:
+        (payload: dict | None, error: str | None)
+    """
+    qtype = (q.get("question_type") or "").strip()
+    builder = _ENTRY_BUILDERS.get(qtype)
+    if builder is None:
+        return None, f"Unsupported question_type: {qtype}"
 
-# ==============================================================================
-# Dispatcher — Route to Correct Builder
-# ==============================================================================
+    entry = builder(q)
+    if entry is None:
+        return None, "No answers provided."
+    return _item_payload(q, entry, position), None
 
 
 def add_item_for_question(domain, course_id, assignment_id, q, token, position=1):
@@ -523,47 +485,43 @@ def add_item_for_question(domain, course_id, assignment_id, q, token, position=1
     Returns:
         (ok: bool, debug: any)
     """
-    qtype = (q.get("question_type") or "").strip()
-
-    # Choice-based
-    if qtype in (
-        "multiple_choice_question",
-        "multiple_answers_question",
-        "true_false_question",
-    ):
-        return add_choice_item(
-            domain, course_id, assignment_id, q, token, position=position
-        )
+    payload, error = build_item_payload(q, position=position)
+    if payload is None:
+        return False, error
+    return _post_item(domain, course_id, assignment_id, payload, token)
 
-    # Short answer
-    if qtype == "short_answer_question":
-        return add_short_answer_item(
-            domain, course_id, assignment_id, q, token, position=position
-        )
 
-    # Essay
-    if qtype == "essay_question":
-        return add_essay_item(
-            domain, course_id, assignment_id, q, token, position=position
-        )
-
-    # Fill-in-multiple-blanks
-    if qtype == "fill_in_multiple_blanks_question":
-        return add_fimb_item(
-            domain, course_id, assignment_id, q, token, position=position
-        )
+def add_items_for_questions(
+    domain, course_id, assignment_id, questions, token, max_workers=6
+):
+    """
+    Add several New Quizzes items concurrently.
 
-    # Matching
-    if qtype == "matching_question":
-        return add_matching_item(
-            domain, course_id, assignment_id, q, token, position=position
-        )
+    Every payload is built up front (no network), then only the POSTs run
+    on the worker pool. Positions are assigned from list order (1-based), so
+    the quiz keeps the storyboard order regardless of completion order.
 
-    # Numerical
-    if qtype == "numerical_question":
-        return add_numerical_item(
-            domain, course_id, assignment_id, q, token, position=position
+    Returns:
+        list[(ok: bool, debug: any)]: One result per question, in order.
+    """
+    if not questions:
+        return []
+
+    built = [
+        build_item_payload(q, position=pos) for pos, q in enumerate(questions, start=1)
+    ]
+    results = [(False, error) for _, error in built]
+    todo = [i for i, (payload, _) in enumerate(built) if payload is not None]
+    if not todo:
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(todo))) as pool:
+        posted = pool.map(
+            lambda i: _post_item(
+                domain, course_id, assignment_id, built[i][0], token
+            ),
+            todo,
         )
-
-    # Unsupported fallback
-    return False, f"Unsupported question_type: {qtype}"
+        for i, result in zip(todo, posted):
+            results[i] = result
+    return results
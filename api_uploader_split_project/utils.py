@@ -52,15 +52,40 @@ def _tag_re(tag: str):
 
     Notes:
         - Caches compiled regex objects for performance.
-        - Preserves original regex behaviour exactly.
+        - The tag name is re.escape()d, so it always matches literally.
     """
     if tag not in TAG_RE_CACHE:
+        name = re.escape(tag)
         TAG_RE_CACHE[tag] = re.compile(
-            rf"<{tag}>\s*(.*?)\s*</{tag}>", re.IGNORECASE | re.DOTALL
+            rf"<{name}>\s*(.*?)\s*</{name}>", re.IGNORECASE | re.DOTALL
         )
     return TAG_RE_CACHE[tag]
 
 
+def _tags_re(tags: tuple):
+    """
+    Return (and cache) one compiled regex matching any of several tags:
+
+        <(tag_a|tag_b|...)>...</same tag>
+
+    Parameters:
+        tags (tuple):
+            Literal tag names (case-insensitive). The tuple itself is the
+            cache key, so callers should pass a stable ordering.
+
+    Returns:
+        Pattern:
+            Compiled regex with DOTALL + IGNORECASE; group 1 is the tag
+            name, group 2 the inner content.
+    """
+    if tags not in TAG_RE_CACHE:
+        names = "|".join(re.escape(t) for t in tags)
+        TAG_RE_CACHE[tags] = re.compile(
+            rf"<({names})>\s*(.*?)\s*</\1>", re.IGNORECASE | re.DOTALL
+        )
+    return TAG_RE_CACHE[tags]
+
+
 # ==============================================================================
 # Public API
 # ==============================================================================
@@ -93,3 +118,45 @@ def extract_tag(tag: str, text: str, default: str = "") -> str:
 
     m = _tag_re(tag).search(text)
     return m.group(1).strip() if m else default
+
+
+def extract_tags(tags, text: str) -> dict:
+    """
+    Extract several simple <tag>...</tag> blocks from text in a single pass.
+
+    Parameters:
+        tags (Iterable[str]):
+            Case-insensitive tag names (e.g., ("page_type", "page_title")).
+        text (str):
+            Input text to search.
+
+    Returns:
+        dict:
+            Lower-cased tag name → stripped inner content, for every tag
+            found. Missing tags are simply absent from the dict.
+
+    Behaviour:
+        - Equivalent to calling extract_tag() once per tag (the first
+          occurrence of each tag wins), but walks the text only once.
+        - Tags nested inside another tag's content are still found: after
+          each match the walk resumes right after its opening tag rather
+          than after its closing tag, e.g.
+              <page_title>Quiz <page_type>quiz</page_type></page_title>
+          yields both page_title and page_type, as extract_tag() would.
+    """
+    found = {}
+    if not text:
+        return found
+
+    wanted = {t.lower() for t in tags}
+    pattern = _tags_re(tuple(tags))
+    pos = 0
+    while len(found) < len(wanted):
+        m = pattern.search(text, pos)
+        if not m:
+            break
+        name = m.group(1).lower()
+        if name not in found:
+            found[name] = m.group(2).strip()
+        pos = m.end(1) + 1  # just past "<name>"
+    return found